@@ -9,13 +9,21 @@ from fitter.utils.print import eprint
 class _CacheStoreConfig:
     _class = 'cache_store'
 
+    def __init__(self, **kwargs):
+        self.NEGATIVE_TTL = kwargs.get('negative_ttl', 0)
+        self.NEGATIVE_MAX_ENTRIES = kwargs.get('negative_max_entries', 10000)
+
     def as_dict(self):
         return self.__dict__
 
 
 class InMemoryCacheStoreConfig(_CacheStoreConfig):
     def __init__(self, **kwargs):
+        super(InMemoryCacheStoreConfig, self).__init__(**kwargs)
         self.TYPE = 'in-memory'
+        self.MAX_ENTRIES = kwargs.get('max_entries', 100000)
+        self.MAX_BYTES = kwargs.get('max_bytes', None)
+        self.TTL = kwargs.get('ttl', None)
 
     def as_dict(self):
         return self.__dict__
@@ -23,28 +31,66 @@ class InMemoryCacheStoreConfig(_CacheStoreConfig):
 
 class RedisCacheStoreConfig(_CacheStoreConfig):
     def __init__(self, **kwargs):
+        super(RedisCacheStoreConfig, self).__init__(**kwargs)
         self.TYPE = 'redis'
         self.HOST = kwargs.get('host', 'localhost')
         self.PORT = kwargs.get('port', 6379)
         self.DB = kwargs.get('db', 0)
         self.PASSWORD = kwargs.get('password', None)
+        self.MAX_CONNECTIONS = kwargs.get('max_connections', None)
+        self.SOCKET_TIMEOUT = kwargs.get('socket_timeout', None)
+        self.SOCKET_CONNECT_TIMEOUT = kwargs.get('socket_connect_timeout', None)
+        self.SOCKET_KEEPALIVE = kwargs.get('socket_keepalive', False)
+        self.TTL = kwargs.get('ttl', None)
+        self.GENERATION_LEASE = kwargs.get('generation_lease', False)
+        self.LEASE_TTL = kwargs.get('lease_ttl', 30)
+        self.LEASE_POLL_INTERVAL = kwargs.get('lease_poll_interval', 0.2)
 
     def as_dict(self):
         return self.__dict__
 
 
+class TieredCacheStoreConfig(RedisCacheStoreConfig):
+    def __init__(self, **kwargs):
+        super(TieredCacheStoreConfig, self).__init__(**kwargs)
+        self.TYPE = 'tiered'
+        self.NEAR_MAX_ENTRIES = kwargs.get('near_max_entries', 1000)
+        self.NEAR_TTL = kwargs.get('near_ttl', 60)
+
+
 class _StorageConfig:
     _class = 'storage'
 
+    def __init__(self, **kwargs):
+        # Only for source storage
+        self.CACHE_LOCATION = kwargs.get('cache_location', None)
+        self.CACHE_MAX_BYTES = kwargs.get('cache_max_bytes', 1024 * 1024 * 1024)
+        self.CACHE_REVALIDATE_AFTER = kwargs.get('cache_revalidate_after', 60)
+        # Only for store storage
+        self.INDEX = kwargs.get('index', False)
+        self.INDEX_CAPACITY = kwargs.get('index_capacity', 10000000)
+        self.INDEX_ERROR_RATE = kwargs.get('index_error_rate', 0.01)
+        self.INDEX_SHARED = kwargs.get('index_shared', False)
+        self.WRITE_BEHIND = kwargs.get('write_behind', False)
+        self.WRITE_BEHIND_BACKLOG = kwargs.get('write_behind_backlog', 64)
+        self.WRITE_BEHIND_THREADS = kwargs.get('write_behind_threads', 4)
+        self.WRITE_BEHIND_MAX_MEMORY_BYTES = kwargs.get('write_behind_max_memory_bytes', 1024 * 1024)
+
     def as_dict(self):
         return self.__dict__
 
 
 class FileSystemStorageConfig(_StorageConfig):
     def __init__(self, location, **kwargs):
+        super(FileSystemStorageConfig, self).__init__(**kwargs)
         self.TYPE = 'fs'
         self.LOCATION = location
         self.BASE_URL = kwargs.get('base_url')
+        self.DIRECT = kwargs.get('direct', False)
+        self.ROOT = kwargs.get('root')
+        if self.DIRECT and self.ROOT is None:
+            eprint('You must set the \'root\' served on the \'base_url\' to write the images directly')
+            sys.exit(-1)
 
 
 class S3StorageConfig(_StorageConfig):
@@ -52,18 +98,46 @@ class S3StorageConfig(_StorageConfig):
         if not S3Storage.is_valid_region(bucket_region):
             eprint('\'{}\' region is not valid for S3'.format(bucket_region))
             sys.exit(-1)
+        super(S3StorageConfig, self).__init__(**kwargs)
         self.TYPE = 's3'
         self.AWS_ACCESS_KEY_ID = aws_access_key_id
         self.AWS_SECRET_ACCESS_KEY = aws_secret_access_key
         self.BUCKET_NAME = bucket_name
         self.BUCKET_REGION = bucket_region
         self.LOCATION = location
+        # Only for store storage
+        self.MULTIPART_THRESHOLD = kwargs.get('multipart_threshold', 8 * 1024 * 1024)
+        self.MULTIPART_CONCURRENCY = kwargs.get('multipart_concurrency', 4)
 
 
 class OptionsConfig:
     def __init__(self, **kwargs):
         self.ENABLE_UPLOAD = kwargs.get('enable_upload', False)
         self.ENABLE_HASH = kwargs.get('enable_hash', False)
+        self.GENERATE_TIMEOUT = kwargs.get('generate_timeout', 30)
+        self.DERIVE_VARIANTS = kwargs.get('derive_variants', False)
+        self.DERIVE_MIN_SCALE = kwargs.get('derive_min_scale', 1.5)
+        self.TRANSFORM_WORKERS = kwargs.get('transform_workers', 0)
+        self.TRANSFORM_QUEUE_SIZE = kwargs.get('transform_queue_size', 16)
+        self.TRANSFORM_TIMEOUT = kwargs.get('transform_timeout', 30)
+        self.TRANSFORM_MAX_JOBS_PER_WORKER = kwargs.get('transform_max_jobs_per_worker', 100)
+        self.ASYNC_IO_THREADS = kwargs.get('async_io_threads', 64)
+        self.CACHE_CONTROL = kwargs.get('cache_control', None)
+        self.JOB_WORKERS = kwargs.get('job_workers', 1)
+        self.JOB_STATUS_TTL = kwargs.get('job_status_ttl', 3600)
+        self.BATCH_MAX_VARIANTS = kwargs.get('batch_max_variants', 16)
+        self.BATCH_UPLOAD_THREADS = kwargs.get('batch_upload_threads', 8)
+        self.MAX_SOURCE_BYTES = kwargs.get('max_source_bytes', 64 * 1024 * 1024)
+        self.MAX_SOURCE_PIXELS = kwargs.get('max_source_pixels', 100000000)
+        self.AUTO_FORMATS = kwargs.get('auto_formats', ['avif', 'webp'])
+        self.AUTO_FALLBACK_FORMAT = kwargs.get('auto_fallback_format', 'jpg')
+        self.ENCODE_PROFILES = kwargs.get('encode_profiles', None) or {}
+        self.DEFAULT_ENCODE_PROFILE = kwargs.get('default_encode_profile', 'none')
+        self.PRESETS = kwargs.get('presets', None) or {}
+        self.ALLOWED_SIZES = kwargs.get('allowed_sizes', None) or []
+        self.SIZE_POLICY = kwargs.get('size_policy', 'snap')
+        self.ENABLE_METRICS = kwargs.get('enable_metrics', False)
+        self.SERVER_TIMING = kwargs.get('server_timing', False)
 
     def as_dict(self):
         return self.__dict__
@@ -85,8 +159,7 @@ class FitterConfig:
         if 'cache_store' in config:
             self._load_cache_store_config(config['cache_store'])
         # Options is optional field
-        if 'options' in config:
-            self._load_options_config(config['options'])
+        self._load_options_config(config.get('options') or {})
         # Storage is required field
         if 'storage' in config:
             self._load_storage_config(config['storage'])
@@ -108,7 +181,7 @@ class FitterConfig:
         if not all(map(lambda e: e in cache_store_config, _required_fields)):
             eprint('There are some missing values for cache store: one of {}'.format(_required_fields))
             return False
-        if cache_store_config['type'] not in ('redis', 'in-memory'):
+        if cache_store_config['type'] not in ('redis', 'in-memory', 'tiered'):
             eprint('\'{}\' is not supported type for cache store'.format(cache_store_config['type']))
             return False
         return True
@@ -121,6 +194,8 @@ class FitterConfig:
             self.CACHE_STORE = RedisCacheStoreConfig(**cache_store_config).as_dict()
         if cache_store_type == 'in-memory':
             self.CACHE_STORE = InMemoryCacheStoreConfig(**cache_store_config).as_dict()
+        if cache_store_type == 'tiered':
+            self.CACHE_STORE = TieredCacheStoreConfig(**cache_store_config).as_dict()
 
     @staticmethod
     def _validate_storage_fields(storage_config):
@@ -0,0 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from fitter.aio.cachestore import ThreadedCacheStore
+from fitter.aio.singleflight import AsyncSingleFlight
+from fitter.aio.storage import ThreadedSourceStorage
+from fitter.aio.storage import ThreadedStoreStorage
+from fitter.cachestore.inmemory import InMemoryStore
+from fitter.components import create_app
+
+# Set up on import, as the ASGI servers import the app (fitter.aio.app:app) directly
+fitter = create_app()
+
+# The blocking I/O of the cache store and storages and the streaming of the images run on this dedicated
+# thread pool, so they never block the event loop. Its size is the limit of the concurrent blocking I/O
+# of all the requests
+io_executor = ThreadPoolExecutor(max_workers=fitter.config['OPTIONS']['ASYNC_IO_THREADS'])
+
+cache_store = None
+if fitter.cache_store is not None:
+    # The in-memory cache store never does I/O, so it is looked up on the event loop directly
+    cache_store = ThreadedCacheStore(fitter.cache_store, io_executor,
+                                     blocking=not isinstance(fitter.cache_store, InMemoryStore))
+source_storage = ThreadedSourceStorage(fitter.source_storage, io_executor)
+store_storage = ThreadedStoreStorage(fitter.store_storage, io_executor)
+single_flight = AsyncSingleFlight()
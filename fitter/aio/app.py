@@ -0,0 +1,204 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from fitter import aio
+from fitter import fitter
+from fitter.aio.http import json_response
+from fitter.aio.http import Response
+from fitter.aio.views import batch_view
+from fitter.aio.views import get_view
+from fitter.aio.views import image_view
+from fitter.aio.views import job_status_view
+from fitter.aio.views import redirect_view
+from fitter.aio.views import show_view
+from fitter.server.paramset import ParamSet
+from fitter.utils.file import generate_hash
+from fitter.utils.metrics import metrics
+from fitter.utils.metrics import server_timing
+from fitter.utils.metrics import start_timings
+from fitter.utils.metrics import stop_timings
+from fitter.views.stream import STREAM_CHUNK_SIZE
+
+_JOB_STATUS_PATH_PREFIX = '/jobs/'
+_BATCH_PATH = '/batch'
+_METRICS_PATH = '/metrics'
+
+_ROUTES = {
+    '/show': show_view,
+    '/get': get_view,
+    '/redirect': redirect_view,
+    '/image': image_view,
+}
+
+
+def _get_header(scope, header_name):
+    for name, value in scope['headers']:
+        if name == header_name:
+            return value.decode('latin-1')
+    return None
+
+
+def _if_none_match(scope, etag):
+    value = _get_header(scope, b'if-none-match')
+    if value is None:
+        return False
+    tags = [tag.strip() for tag in value.split(',')]
+    # Same as the flask one, only the concrete ETags, compared weakly
+    return '"{}"'.format(etag) in tags or 'W/"{}"'.format(etag) in tags
+
+
+def _image_url(scope):
+    # The url of the image action with the same params, absolute like the url_for of flask
+    host = _get_header(scope, b'host')
+    if host is None and scope.get('server'):
+        host = '{}:{}'.format(*scope['server'])
+    base = '{}://{}'.format(scope.get('scheme', 'http'), host) if host is not None else ''
+    return '{}{}/image?{}'.format(base, scope.get('root_path', ''), scope['query_string'].decode('latin-1'))
+
+
+def _negotiate_format(scope, param_set):
+    return param_set.negotiate_format(_get_header(scope, b'accept'), fitter.auto_formats,
+                                      fitter.config['OPTIONS']['AUTO_FALLBACK_FORMAT'])
+
+
+def _vary_on_accept(response):
+    # The caches must not serve the image chosen for the other clients
+    response.headers['Vary'] = 'Accept'
+    return response
+
+
+async def _read_json(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body.decode('utf8'))
+    except ValueError:
+        return None
+
+
+async def _handle_batch(scope, receive):
+    if scope['method'] != 'POST':
+        return json_response(status=405, errors='Only POST method is allowed')
+    param_sets, errors = ParamSet.from_batch(await _read_json(receive),
+                                             fitter.config['OPTIONS']['BATCH_MAX_VARIANTS'])
+    if errors:
+        return _no_store(json_response(errors=errors))
+    negotiated = [_negotiate_format(scope, param_set) for param_set in param_sets]
+    response = await batch_view(param_sets)
+    return _vary_on_accept(response) if any(negotiated) else response
+
+
+def _metrics_response():
+    return Response(
+        metrics.render().encode('utf8'),
+        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+    )
+
+
+def _no_store(response):
+    # The status, metrics and errors change over time
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _add_cache_control(response):
+    # Only the successful responses of the actions of a single image never change, as the url is its hash.
+    # The errors set their own
+    cache_control = fitter.config['OPTIONS']['CACHE_CONTROL']
+    if cache_control is not None and response.status < 400 and 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = cache_control
+    return response
+
+
+async def _handle(scope, receive):
+    if scope['path'] == _METRICS_PATH and fitter.config['OPTIONS']['ENABLE_METRICS']:
+        return _no_store(_metrics_response())
+    if scope['path'] == _BATCH_PATH:
+        return await _handle_batch(scope, receive)
+    if scope['path'].startswith(_JOB_STATUS_PATH_PREFIX):
+        return _no_store(await job_status_view(scope['path'][len(_JOB_STATUS_PATH_PREFIX):]))
+    view = _ROUTES.get(scope['path'])
+    if view is None:
+        return json_response(status=404, errors='The action {} is not found'.format(scope['path']))
+    if scope['method'] != 'GET':
+        return json_response(status=405, errors='Only GET method is allowed')
+    # Takes the first value of each param like the request.args of flask
+    query = parse_qs(scope['query_string'].decode('utf8'), keep_blank_values=True)
+    param_set = ParamSet.from_args({key: values[0] for key, values in query.items()})
+    if not param_set.validate():
+        return _no_store(json_response(errors=param_set.errors))
+    negotiated = _negotiate_format(scope, param_set)
+    hashed = generate_hash(param_set)
+    if view is image_view and _if_none_match(scope, hashed):
+        response = Response(status=304, headers={'ETag': '"{}"'.format(hashed)})
+    else:
+        response = await view(hashed, param_set, _image_url(scope))
+    _add_cache_control(response)
+    return _vary_on_accept(response) if negotiated else response
+
+
+async def _handle_with_timings(scope, receive):
+    if not fitter.config['OPTIONS']['SERVER_TIMING']:
+        return await _handle(scope, receive)
+    token = start_timings()
+    try:
+        response = await _handle(scope, receive)
+    finally:
+        timings = stop_timings(token)
+    if timings:
+        response.headers['Server-Timing'] = server_timing(timings)
+    return response
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application serving the same actions as the flask one"""
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    # Only the handling of the request, not the streaming of the response after it like the flask one
+    metrics.inc('fitter_requests_in_flight')
+    try:
+        response = await _handle_with_timings(scope, receive)
+    finally:
+        metrics.dec('fitter_requests_in_flight')
+    await send({
+        'type': 'http.response.start',
+        'status': response.status,
+        'headers': [(name.encode('latin-1'), value.encode('latin-1'))
+                    for name, value in response.headers.items()],
+    })
+    if response.stream is None:
+        await send({
+            'type': 'http.response.body',
+            'body': response.body,
+        })
+        return
+    loop = asyncio.get_event_loop()
+    try:
+        while True:
+            chunk = await loop.run_in_executor(aio.io_executor, response.stream.read, STREAM_CHUNK_SIZE)
+            await send({
+                'type': 'http.response.body',
+                'body': chunk,
+                'more_body': bool(chunk),
+            })
+            if not chunk:
+                return
+    finally:
+        response.stream.close()
@@ -0,0 +1,54 @@
+import asyncio
+import functools
+
+
+class AsyncCacheStore(object):
+    """Common interface for async cache store operations"""
+    async def get(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    async def set(self, key, value, ttl=None):
+        raise NotImplementedError('You must implement this method')
+
+    async def delete(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    async def get_many(self, keys):
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, mapping, ttl=None):
+        for key, value in mapping.items():
+            await self.set(key, value, ttl=ttl)
+
+
+class ThreadedCacheStore(AsyncCacheStore):
+    """Runs the operations of a cache store on the thread pool, so they never block the event loop
+
+    :param blocking: Whether if the operations of the cache store do I/O. If not, runs them directly
+    """
+
+    def __init__(self, cache_store, executor=None, blocking=True):
+        self.cache_store = cache_store
+        self.executor = executor
+        self.blocking = blocking
+
+    async def _run(self, func, *args, **kwargs):
+        if not self.blocking:
+            return func(*args, **kwargs)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def get(self, key):
+        return await self._run(self.cache_store.get, key)
+
+    async def set(self, key, value, ttl=None):
+        return await self._run(self.cache_store.set, key, value, ttl=ttl)
+
+    async def delete(self, key):
+        return await self._run(self.cache_store.delete, key)
+
+    async def get_many(self, keys):
+        return await self._run(self.cache_store.get_many, keys)
+
+    async def set_many(self, mapping, ttl=None):
+        return await self._run(self.cache_store.set_many, mapping, ttl=ttl)
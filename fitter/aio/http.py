@@ -0,0 +1,26 @@
+import json
+
+
+class Response(object):
+    """A response of the ASGI application
+
+    :param stream: The file object to stream as the body instead of the body
+    """
+
+    def __init__(self, body=b'', status=200, headers=None, stream=None):
+        self.body = body
+        self.status = status
+        self.headers = headers or {}
+        self.stream = stream
+
+
+def json_response(status=200, **fields):
+    return Response(
+        json.dumps(fields).encode('utf8'),
+        status=status,
+        headers={'Content-Type': 'application/json'},
+    )
+
+
+def redirect_response(url, status=302):
+    return Response(status=status, headers={'Location': url})
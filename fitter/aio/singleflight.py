@@ -0,0 +1,20 @@
+import asyncio
+
+
+class AsyncSingleFlight(object):
+    """Coalesces the concurrent coroutines for the same key into a single execution
+
+    The first caller of a key runs the coroutine and the others wait for its result
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, func, *args, timeout=None, **kwargs):
+        call = self.calls.get(key)
+        if call is None:
+            call = asyncio.ensure_future(func(*args, **kwargs))
+            self.calls[key] = call
+            call.add_done_callback(lambda _: self.calls.pop(key, None))
+        # Shields the call, so a timed out waiter does not cancel it for the others
+        return await asyncio.wait_for(asyncio.shield(call), timeout)
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+
+
+class AsyncSourceStorage(object):
+    """Common interface for async storage as source"""
+
+    async def exists(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    async def get(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    async def fetch(self, key, validator=None):
+        if not await self.exists(key):
+            return None
+        return await self.get(key), None
+
+
+class AsyncStoreStorage(object):
+    """Common interface for async storage as store
+
+    The get_path and generate_url do not do any I/O, so they are not coroutines
+    """
+
+    async def exists(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    async def get(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    def get_path(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    async def save(self, key, file):
+        raise NotImplementedError('You must implement this method')
+
+    def is_pending(self, key):
+        return False
+
+    def generate_url(self, key):
+        raise NotImplementedError('You must implement this method')
+
+
+class _ThreadedStorage(object):
+    def __init__(self, storage, executor=None):
+        self.storage = storage
+        self.executor = executor
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+
+class ThreadedSourceStorage(_ThreadedStorage, AsyncSourceStorage):
+    """Runs the operations of a source storage on the thread pool, so they never block the event loop"""
+
+    async def exists(self, key):
+        return await self._run(self.storage.exists, key)
+
+    async def get(self, key):
+        return await self._run(self.storage.get, key)
+
+    async def fetch(self, key, validator=None):
+        return await self._run(self.storage.fetch, key, validator)
+
+
+class ThreadedStoreStorage(_ThreadedStorage, AsyncStoreStorage):
+    """Runs the operations of a store storage on the thread pool, so they never block the event loop"""
+
+    async def exists(self, key):
+        return await self._run(self.storage.exists, key)
+
+    async def get(self, key):
+        return await self._run(self.storage.get, key)
+
+    def get_path(self, key):
+        return self.storage.get_path(key)
+
+    async def save(self, key, file):
+        return await self._run(self.storage.save, key, file)
+
+    def is_pending(self, key):
+        # Only looks up the memory of the write behind store storage
+        return self.storage.is_pending(key)
+
+    def generate_url(self, key):
+        return self.storage.generate_url(key)
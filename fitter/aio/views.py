@@ -0,0 +1,248 @@
+import asyncio
+import contextvars
+import functools
+
+from fitter import aio
+from fitter import fitter
+from fitter.aio.http import json_response
+from fitter.aio.http import Response
+from fitter.aio.http import redirect_response
+from fitter.cachestore.lease import LeaseTimeout
+from fitter.cachestore.negative import InMemoryNegativeCache
+from fitter.jobqueue import JobQueue
+from fitter.utils.file import get_mimetype
+from fitter.utils.metrics import metrics
+from fitter.views.errors import generation_timed_out
+from fitter.views.errors import job_not_found
+from fitter.views.errors import source_not_found
+from fitter.views.pipeline import add_missing
+from fitter.views.pipeline import cached_filename
+from fitter.views.pipeline import error_of
+from fitter.views.pipeline import fetch_derivable_variant
+from fitter.views.pipeline import generate_batch_or_error
+from fitter.views.pipeline import is_missing
+from fitter.views.pipeline import is_uploaded
+from fitter.views.pipeline import read_source
+from fitter.views.pipeline import release_when_uploaded
+from fitter.views.pipeline import remember
+from fitter.views.pipeline import store
+from fitter.views.pipeline import transform_image
+
+
+def _in_context(func, *args, **kwargs):
+    # The stages timed on the executors are added to the Server-Timing of the request too
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+async def _run_blocking(func, *args, **kwargs):
+    # The I/O of the cache store, storages and lease, so they run on the dedicated thread pool
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(aio.io_executor, _in_context(func, *args, **kwargs))
+
+
+async def _run_generation(func, *args):
+    # The CPU-bound transform (or waiting for the transform executor) and the batch,
+    # so they run on the default executor not to starve the I/O of the other requests
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, _in_context(func, *args))
+
+
+def _error_response(error):
+    status, message = error
+    response = json_response(status=status, errors=message)
+    # Never cached along with the images, same as the flask one
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+async def _fetch_source(path):
+    with metrics.timed('source_fetch'):
+        return await aio.source_storage.fetch(path)
+
+
+async def _generate(hashed, param_set):
+    # Same steps as the sync one, but only the transform takes a thread of the default executor
+    source_image = await _run_blocking(fetch_derivable_variant, param_set)
+    if source_image is None:
+        fetched = await _fetch_source(param_set.path)
+        if fetched is None:
+            await _run_blocking(add_missing, param_set.path)
+            return False
+        source_image = fetched[0]
+    # Reading the source image is still the I/O, e.g. the body of the S3 object
+    original_image = await _run_blocking(read_source, source_image)
+    transformed_image, size = await _run_generation(transform_image, param_set.mode, original_image, param_set)
+    await _run_blocking(store, hashed, param_set, transformed_image, size)
+    return True
+
+
+async def _generate_with_lease(hashed, param_set):
+    lease = fitter.generation_lease
+    if lease is None:
+        return await _generate(hashed, param_set)
+    # Same as GenerationLease.run, but waits for the other node holding the lease on the event loop,
+    # not on a thread sleeping between the polls
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + fitter.config['OPTIONS']['GENERATE_TIMEOUT']
+    while True:
+        release = await _run_blocking(lease.acquire, hashed)
+        if release is not None:
+            try:
+                generated = await _generate(hashed, param_set)
+            except BaseException:
+                # Cancelled too, e.g. on the shutdown, so the other nodes do not wait for the ttl
+                await _run_blocking(release)
+                raise
+            # Held until the image is uploaded, so the others do not generate it again in the meantime
+            await _run_blocking(release_when_uploaded, hashed, release)
+            return generated
+        while await _run_blocking(lease.is_held, hashed):
+            if await _run_blocking(is_uploaded, hashed):
+                return True
+            if loop.time() > deadline:
+                raise LeaseTimeout('Timed out waiting for the lease of \'{}\''.format(hashed))
+            await asyncio.sleep(lease.poll_interval)
+        if await _run_blocking(is_uploaded, hashed):
+            return True
+
+
+async def _generate_or_error(hashed, param_set):
+    # Same as the sync views, but the concurrent requests for the same variant share a single coroutine
+    try:
+        generated = await aio.single_flight.do(hashed, _generate_with_lease, hashed, param_set,
+                                               timeout=fitter.config['OPTIONS']['GENERATE_TIMEOUT'])
+    except asyncio.TimeoutError:
+        return generation_timed_out(param_set.path)
+    except Exception as e:
+        return error_of(e, param_set.path)
+    if not generated:
+        return source_not_found(param_set.path)
+    # Caches it right away unless it is being uploaded, so it may be the I/O too
+    await _run_blocking(remember, hashed)
+    return None
+
+
+def _pending(response):
+    # Responds the url on the store storage once uploaded, same as the flask one
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+async def _respond(action, filename, image_url):
+    if action == 'image':
+        return Response(
+            headers={'Content-Type': get_mimetype(filename), 'ETag': '"{}"'.format(filename)},
+            stream=await aio.store_storage.get(filename),
+        )
+    # The url on the store storage is not found while the image is being uploaded, so the image action serves it
+    pending = aio.store_storage.is_pending(filename)
+    url = image_url if pending else aio.store_storage.generate_url(filename)
+    if action == 'show':
+        response = json_response(
+            url=url,
+        )
+    elif action == 'get':
+        response = json_response(
+            filename=filename,
+            path=aio.store_storage.get_path(filename),
+            url=url,
+        )
+    else:
+        response = redirect_response(url)
+    return _pending(response) if pending else response
+
+
+async def _find_cached(hashed):
+    if aio.cache_store is None:
+        return None
+    with metrics.timed('cache_lookup'):
+        cached = await aio.cache_store.get(hashed)
+    metrics.lookup('cache_store', cached is not None)
+    return cached_filename(cached)
+
+
+async def _is_missing(path):
+    if fitter.negative_cache is None or isinstance(fitter.negative_cache, InMemoryNegativeCache):
+        # Never does I/O, same as the in-memory cache store
+        return is_missing(path)
+    return await _run_blocking(is_missing, path)
+
+
+async def _is_stored(hashed):
+    with metrics.timed('store_exists'):
+        exists = await aio.store_storage.exists(hashed)
+    metrics.lookup('store_storage', exists)
+    return exists
+
+
+async def _lookup(action, hashed, param_set, image_url):
+    # Looks up the cache store, the negative cache and the store storage in order, same as the sync views
+    filename = await _find_cached(hashed)
+    if filename is not None:
+        return await _respond(action, filename, image_url)
+    if await _is_missing(param_set.path):
+        return _error_response(source_not_found(param_set.path))
+    if await _is_stored(hashed):
+        return await _respond(action, hashed, image_url)
+    return None
+
+
+async def _view(action, hashed, param_set, image_url):
+    response = await _lookup(action, hashed, param_set, image_url)
+    if response is not None:
+        return response
+    error = await _generate_or_error(hashed, param_set)
+    if error is not None:
+        return _error_response(error)
+    return await _respond(action, hashed, image_url)
+
+
+async def show_view(hashed, param_set, image_url):
+    response = await _lookup('show', hashed, param_set, image_url)
+    if response is not None:
+        return response
+    # Same as the sync one, the image is generated on the background by the job workers
+    await _run_blocking(fitter.job_queue.put, hashed, param_set)
+    return json_response(
+        url=aio.store_storage.generate_url(hashed),
+        job='/jobs/{}'.format(hashed),
+    )
+
+
+async def batch_view(param_sets):
+    filenames, error = await _run_generation(generate_batch_or_error, param_sets)
+    if error is not None:
+        return _error_response(error)
+    return json_response(
+        images=[{
+            'filename': filename,
+            'path': aio.store_storage.get_path(filename),
+            'url': aio.store_storage.generate_url(filename),
+        } for filename in filenames],
+    )
+
+
+async def job_status_view(hashed):
+    status = await _run_blocking(fitter.job_queue.get_status, hashed)
+    if status is None:
+        if not await aio.store_storage.exists(hashed):
+            return _error_response(job_not_found(hashed))
+        status = {'status': JobQueue.RUNNING if aio.store_storage.is_pending(hashed) else JobQueue.DONE}
+    fields = {'hash': hashed, 'status': status['status']}
+    if status['status'] == JobQueue.DONE:
+        fields['url'] = aio.store_storage.generate_url(hashed)
+    if status.get('error'):
+        fields['error'] = status['error']
+    return json_response(**fields)
+
+
+async def get_view(hashed, param_set, image_url):
+    return await _view('get', hashed, param_set, image_url)
+
+
+async def redirect_view(hashed, param_set, image_url):
+    return await _view('redirect', hashed, param_set, image_url)
+
+
+async def image_view(hashed, param_set, image_url):
+    return await _view('image', hashed, param_set, image_url)
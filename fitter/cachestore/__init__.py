@@ -1,7 +1,28 @@
 class CacheStore(object):
     """Common interface for cache store operations"""
-    def get(self):
+    def get(self, key):
         raise NotImplementedError('You must implement this method')
 
-    def set(self):
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError('You must implement this method')
+
+    def delete(self, key):
+        raise NotImplementedError('You must implement this method')
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set_many(self, mapping, ttl=None):
+        for key, value in mapping.items():
+            self.set(key, value, ttl=ttl)
+
+    def set_field(self, key, field, value, ttl=None):
+        """Set a field of the fields of the key atomically, so the concurrent sets of the other fields are kept"""
+        raise NotImplementedError('You must implement this method')
+
+    def get_fields(self, key):
+        """Get all the fields of the key as a dict, which is empty if the key does not exist"""
+        raise NotImplementedError('You must implement this method')
+
+    def delete_fields(self, key, fields):
         raise NotImplementedError('You must implement this method')
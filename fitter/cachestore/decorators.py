@@ -1,46 +1,41 @@
 from functools import wraps
 
-from flask import jsonify
-from flask import redirect
-
-from fitter import fitter
+from fitter.views.errors import error_response
+from fitter.views.errors import source_not_found
+from fitter.views.pipeline import find_cached
+from fitter.views.pipeline import is_missing
+from fitter.views.stream import get_image
+from fitter.views.stream import redirect_to_image
+from fitter.views.stream import show_image
+from fitter.views.stream import stream_image
 
 
 def from_cache_store(action):
     def from_cache_store_decorator(func):
         @wraps(func)
         def func_wrapper(hashed, param_set):
-            if fitter.cache_store is not None:
-                cached = fitter.cache_store.get(fitter.store_storage.get_path(hashed))
-                if cached is not None:
-                    if action == 'show':
-                        return jsonify(
-                            url=cached['url'],
-                        )
-                    if action == 'get':
-                        return jsonify(
-                            filename=cached['filename'],
-                            path=cached['path'],
-                            url=cached['url'],
-                        )
-                    if action == 'redirect':
-                        return redirect(cached['url'], code=302)
+            filename = find_cached(hashed)
+            if filename is not None:
+                if action == 'show':
+                    return show_image(filename)
+                if action == 'get':
+                    return get_image(filename)
+                if action == 'redirect':
+                    return redirect_to_image(filename)
+                if action == 'image':
+                    return stream_image(filename)
             return func(hashed, param_set)
         return func_wrapper
     return from_cache_store_decorator
 
 
-def cache():
-    def cache_decorator(func):
+def from_negative_cache():
+    def from_negative_cache_decorator(func):
         @wraps(func)
         def func_wrapper(hashed, param_set):
-            result = func(hashed, param_set)
-            if fitter.cache_store is not None:
-                fitter.cache_store.set(hashed, {
-                    'filename': hashed,
-                    'path': fitter.store_storage.get_path(hashed),
-                    'url': fitter.store_storage.generate_url(hashed),
-                })
-            return result
+            # The paths recently not found on the source storage are rejected without any storage round trip
+            if is_missing(param_set.path):
+                return error_response(source_not_found(param_set.path))
+            return func(hashed, param_set)
         return func_wrapper
-    return cache_decorator
+    return from_negative_cache_decorator
@@ -1,14 +1,125 @@
-import json
+import sys
+import threading
+import time
+from collections import OrderedDict
 
 from fitter.cachestore import CacheStore
 
 
+def _sizeof(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(_sizeof(e) for e in obj)
+    return size
+
+
 class InMemoryStore(CacheStore):
-    def __init__(self):
-        self.kvstore = {}
+    """A bounded in-memory store which evicts the least recently used entries
+
+    :param max_entries: The maximum number of entries. Unbounded if None
+    :param max_bytes: The maximum (approximate) bytes of entries. Unbounded if None
+    :param ttl: The default seconds until an entry expires. Never expires if None
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None):
+        # key -> (value, size, expires_at)
+        self.kvstore = OrderedDict()
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key):
+        _, size, _ = self.kvstore.pop(key)
+        self.bytes -= size
+
+    def _is_full(self):
+        if self.max_entries is not None and len(self.kvstore) > self.max_entries:
+            return True
+        if self.max_bytes is not None and self.bytes > self.max_bytes:
+            return True
+        return False
+
+    def _get(self, key):
+        entry = self.kvstore.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, _, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.kvstore.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _expires_at(self, ttl):
+        ttl = ttl if ttl is not None else self.ttl
+        return time.time() + ttl if ttl is not None else None
+
+    def _set(self, key, value, expires_at):
+        size = _sizeof(key) + _sizeof(value)
+        if key in self.kvstore:
+            self._remove(key)
+        self.kvstore[key] = (value, size, expires_at)
+        self.bytes += size
+        while self._is_full():
+            self._remove(next(iter(self.kvstore)))
+            self.evictions += 1
 
     def get(self, key):
-        return json.loads(self.kvstore[key]) if key in self.kvstore else None
+        with self.lock:
+            return self._get(key)
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self._set(key, value, self._expires_at(ttl))
+
+    def set_field(self, key, field, value, ttl=None):
+        with self.lock:
+            # Copies the fields, as the ones returned by get_fields might be being read
+            fields = dict(self._get(key) or {})
+            fields[field] = value
+            self._set(key, fields, self._expires_at(ttl))
+
+    def get_fields(self, key):
+        with self.lock:
+            return dict(self._get(key) or {})
+
+    def delete_fields(self, key, fields):
+        with self.lock:
+            remaining = self._get(key)
+            if remaining is not None:
+                remaining = {field: value for field, value in remaining.items() if field not in fields}
+                # Keeps the expiration of the key
+                self._set(key, remaining, self.kvstore[key][2])
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.kvstore:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.kvstore.clear()
+            self.bytes = 0
 
-    def set(self, key, value):
-        self.kvstore[key] = json.dumps(value)
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.kvstore),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,84 @@
+import threading
+import time
+
+from fitter.utils.print import eprint
+
+
+class LeaseTimeout(Exception):
+    pass
+
+
+class GenerationLease(object):
+    """Lets only a single node generate the same image at a time using the leases on redis
+
+    The lease expires after ttl seconds, so the other nodes can take it over if the holder dies.
+    While held, it is renewed every third of the ttl, so a generation (or upload) longer than the ttl keeps it
+    """
+
+    def __init__(self, redis_store, ttl=30, poll_interval=0.2):
+        self.redis_store = redis_store
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+
+    def _keep_renewing(self, key, token, released):
+        while not released.wait(self.ttl / 3):
+            try:
+                if not self.redis_store.renew_lease(key, token, self.ttl):
+                    # Expired and taken over by the other node, e.g. this node was paused over the ttl
+                    return
+            except Exception as e:
+                # Retried on the next renewal, as the lease is still valid for the rest of the ttl
+                eprint('Failed to renew the lease of \'{}\': {}'.format(key, e))
+
+    def acquire(self, key):
+        """Acquire the lease of the key, which is renewed until it is released
+
+        :return: The function releasing the lease if acquired, None if the other node holds it
+        """
+        token = self.redis_store.acquire_lease(key, self.ttl)
+        if token is None:
+            return None
+        released = threading.Event()
+        threading.Thread(target=self._keep_renewing, args=(key, token, released), daemon=True).start()
+
+        def release():
+            released.set()
+            self.redis_store.release_lease(key, token)
+        return release
+
+    def is_held(self, key):
+        """Whether if any node holds the lease of the key"""
+        return self.redis_store.has_lease(key)
+
+    def run(self, key, func, is_done, timeout=None, release_later=None):
+        """Run the func only if this node holds the lease of the key
+
+        If the other node holds the lease, waits until is_done returns True or the lease is gone.
+        If the lease is gone without a result, tries to acquire the lease again
+
+        :param release_later: The function called with the function releasing the lease after func returns,
+                              to hold the lease until e.g. the result is uploaded. Released right away if None
+        :return: The result of func, or True if the other node has done it
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        while True:
+            release = self.acquire(key)
+            if release is not None:
+                try:
+                    result = func()
+                except Exception:
+                    release()
+                    raise
+                if release_later is None:
+                    release()
+                else:
+                    release_later(release)
+                return result
+            while self.is_held(key):
+                if is_done():
+                    return True
+                if deadline is not None and time.time() > deadline:
+                    raise LeaseTimeout('Timed out waiting for the lease of \'{}\''.format(key))
+                time.sleep(self.poll_interval)
+            if is_done():
+                return True
@@ -0,0 +1,42 @@
+import time
+
+from fitter.cachestore.inmemory import InMemoryStore
+
+
+class InMemoryNegativeCache(object):
+    """Remembers the source paths not found on the source storage for a short time, in memory"""
+
+    def __init__(self, max_entries, ttl):
+        self.store = InMemoryStore(max_entries=max_entries, ttl=ttl)
+
+    def is_missing(self, path):
+        return self.store.get(path) is not None
+
+    def add(self, path):
+        self.store.set(path, True)
+
+
+class RedisNegativeCache(object):
+    """Remembers the source paths not found on the source storage for a short time, on redis
+
+    The paths are kept in a sorted set scored by their expiry time, so the oldest ones can be trimmed
+    """
+
+    KEY = 'negative:missing'
+
+    def __init__(self, redis_store, max_entries, ttl):
+        self.redis = redis_store.redis
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def is_missing(self, path):
+        expires_at = self.redis.zscore(self.KEY, path)
+        return expires_at is not None and expires_at > time.time()
+
+    def add(self, path):
+        now = time.time()
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.zadd(self.KEY, path, now + self.ttl)
+        pipeline.zremrangebyscore(self.KEY, '-inf', now)
+        pipeline.zremrangebyrank(self.KEY, 0, -self.max_entries - 1)
+        pipeline.execute()
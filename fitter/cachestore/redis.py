@@ -1,22 +1,134 @@
 import json
+import uuid
 
+from redis import BlockingConnectionPool
+from redis import ConnectionPool
 from redis import Redis
 
 from fitter.cachestore import CacheStore
 
 
+def _encode(value):
+    # The plain strings (e.g. filename) are stored raw after a '=' marker, the others as compact json
+    if isinstance(value, str):
+        return b'=' + value.encode('utf8')
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _decode(value):
+    if value is None:
+        return None
+    if value.startswith(b'='):
+        return value[1:].decode('utf8')
+    return json.loads(value.decode('utf8'))
+
+
 class RedisStore(CacheStore):
-    def __init__(self, host, port, db, password):
-        self.redis = Redis(
+    """A cache store backed by redis
+
+    :param max_connections: The maximum number of pooled connections. If set, waits for a free connection
+    :param socket_timeout: Seconds to wait for a response of redis
+    :param socket_connect_timeout: Seconds to wait for connecting to redis
+    :param socket_keepalive: Whether if use TCP keep-alive for the connections
+    :param ttl: The default seconds until a key expires. Never expires if None
+    """
+
+    LEASE_KEY_PREFIX = 'lease:'
+
+    # Deletes the lease only if it is still held by the given token
+    _RELEASE_LEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    # Extends the lease only if it is still held by the given token
+    _RENEW_LEASE_SCRIPT = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('pexpire', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+
+    def __init__(self, host, port, db, password, max_connections=None, socket_timeout=None,
+                 socket_connect_timeout=None, socket_keepalive=False, ttl=None):
+        pool_class = BlockingConnectionPool if max_connections is not None else ConnectionPool
+        pool_kwargs = {'max_connections': max_connections} if max_connections is not None else {}
+        self.pool = pool_class(
             host=host,
             port=port,
             db=db,
             password=password,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_connect_timeout,
+            socket_keepalive=socket_keepalive,
+            **pool_kwargs
         )
+        self.redis = Redis(connection_pool=self.pool)
+        self.ttl = ttl
+        self._release_lease = self.redis.register_script(self._RELEASE_LEASE_SCRIPT)
+        self._renew_lease = self.redis.register_script(self._RENEW_LEASE_SCRIPT)
+
+    def _px(self, ttl):
+        ttl = ttl if ttl is not None else self.ttl
+        return int(ttl * 1000) if ttl is not None else None
 
     def get(self, key):
-        value = self.redis.get(key)
-        return json.loads(value) if value is not None else None
+        return _decode(self.redis.get(key))
+
+    def set(self, key, value, ttl=None):
+        return self.redis.set(key, _encode(value), px=self._px(ttl))
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        return [_decode(value) for value in self.redis.mget(keys)]
+
+    def set_many(self, mapping, ttl=None):
+        px = self._px(ttl)
+        pipeline = self.redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipeline.set(key, _encode(value), px=px)
+        return pipeline.execute()
+
+    def delete(self, key):
+        return self.redis.delete(key)
+
+    def set_field(self, key, field, value, ttl=None):
+        px = self._px(ttl)
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.hset(key, field, _encode(value))
+        if px is not None:
+            pipeline.pexpire(key, px)
+        return pipeline.execute()[0]
+
+    def get_fields(self, key):
+        return {field.decode('utf8'): _decode(value) for field, value in self.redis.hgetall(key).items()}
+
+    def delete_fields(self, key, fields):
+        if fields:
+            return self.redis.hdel(key, *fields)
+
+    def acquire_lease(self, key, ttl):
+        """Acquire the lease of the key which expires after ttl seconds
+
+        :return: The token for releasing the lease if acquired, None otherwise
+        """
+        token = uuid.uuid4().hex
+        if self.redis.set(self.LEASE_KEY_PREFIX + key, token, px=int(ttl * 1000), nx=True):
+            return token
+        return None
+
+    def release_lease(self, key, token):
+        return self._release_lease(keys=[self.LEASE_KEY_PREFIX + key], args=[token])
+
+    def renew_lease(self, key, token, ttl):
+        """Extend the lease held by the token to expire after ttl seconds from now
+
+        :return: Whether if the lease is still held by the token
+        """
+        return bool(self._renew_lease(keys=[self.LEASE_KEY_PREFIX + key], args=[token, int(ttl * 1000)]))
 
-    def set(self, key, value):
-        return self.redis.set(key, json.dumps(value))
+    def has_lease(self, key):
+        return self.redis.exists(self.LEASE_KEY_PREFIX + key)
@@ -0,0 +1,120 @@
+import threading
+import time
+import uuid
+
+from redis.exceptions import RedisError
+
+from fitter.cachestore import CacheStore
+from fitter.utils.metrics import metrics
+from fitter.utils.print import eprint
+
+
+class TieredStore(CacheStore):
+    """A two-tier cache store which puts a process-local near cache in front of redis
+
+    When a key is overwritten or deleted, the peers evict it from their near caches through redis pub/sub
+    """
+
+    INVALIDATION_CHANNEL = 'fitter:invalidate'
+
+    # Seconds of the longest backoff to reconnect
+    MAX_RECONNECT_INTERVAL = 30
+
+    def __init__(self, redis_store, near_store, reconnect_interval=1):
+        self.redis_store = redis_store
+        self.near_store = near_store
+        self.reconnect_interval = reconnect_interval
+        self.node_id = uuid.uuid4().hex
+        self.subscriber = threading.Thread(target=self._subscribe, daemon=True)
+        self.subscriber.start()
+
+    def _listen(self):
+        pubsub = self.redis_store.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(self.INVALIDATION_CHANNEL)
+            # The invalidations might be missed while disconnected
+            self.near_store.clear()
+            for message in pubsub.listen():
+                if message['type'] == 'message':
+                    self._on_invalidate(message['data'])
+        finally:
+            pubsub.close()
+
+    def _subscribe(self):
+        # Never returns, as the near caches of this node are never invalidated without it
+        interval = self.reconnect_interval
+        while True:
+            started_at = time.time()
+            try:
+                self._listen()
+            except RedisError:
+                # e.g. the TimeoutError of the socket_timeout on the idle channel, which is not a ConnectionError
+                pass
+            except Exception as e:
+                eprint('The subscriber of the near cache invalidations failed: {}'.format(e))
+            if time.time() - started_at > self.MAX_RECONNECT_INTERVAL:
+                interval = self.reconnect_interval
+            time.sleep(interval)
+            interval = min(interval * 2, self.MAX_RECONNECT_INTERVAL)
+
+    def _on_invalidate(self, data):
+        node_id, key = data.decode('utf8').split(' ', 1)
+        if node_id != self.node_id:
+            self.near_store.delete(key)
+
+    def _publish_invalidation(self, key):
+        self.redis_store.redis.publish(self.INVALIDATION_CHANNEL, ' '.join([self.node_id, key]))
+
+    def get(self, key):
+        value = self.near_store.get(key)
+        metrics.lookup('near_cache', value is not None)
+        if value is not None:
+            return value
+        value = self.redis_store.get(key)
+        metrics.lookup('redis_cache', value is not None)
+        if value is not None:
+            self.near_store.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        result = self.redis_store.set(key, value, ttl=ttl)
+        self.near_store.set(key, value)
+        self._publish_invalidation(key)
+        return result
+
+    def get_many(self, keys):
+        values = [self.near_store.get(key) for key in keys]
+        missed_keys = [key for key, value in zip(keys, values) if value is None]
+        fetched = dict(zip(missed_keys, self.redis_store.get_many(missed_keys)))
+        for key, value in fetched.items():
+            if value is not None:
+                self.near_store.set(key, value)
+            metrics.lookup('redis_cache', value is not None)
+        metrics.lookup('near_cache', True, len(keys) - len(missed_keys))
+        metrics.lookup('near_cache', False, len(missed_keys))
+        return [value if value is not None else fetched[key] for key, value in zip(keys, values)]
+
+    def set_many(self, mapping, ttl=None):
+        result = self.redis_store.set_many(mapping, ttl=ttl)
+        pipeline = self.redis_store.redis.pipeline(transaction=False)
+        for key, value in mapping.items():
+            self.near_store.set(key, value)
+            pipeline.publish(self.INVALIDATION_CHANNEL, ' '.join([self.node_id, key]))
+        pipeline.execute()
+        return result
+
+    def set_field(self, key, field, value, ttl=None):
+        # The fields are not cached in the near cache, so they are always up to date
+        return self.redis_store.set_field(key, field, value, ttl=ttl)
+
+    def get_fields(self, key):
+        return self.redis_store.get_fields(key)
+
+    def delete_fields(self, key, fields):
+        return self.redis_store.delete_fields(key, fields)
+
+    def delete(self, key):
+        result = self.redis_store.delete(key)
+        self.near_store.delete(key)
+        self._publish_invalidation(key)
+        return result
@@ -0,0 +1,76 @@
+import time
+
+# The formats which keep all the pixels, so their variants can derive the ones of any format and quality
+_LOSSLESS_FORMATS = ('png',)
+
+# The settings of the encode profile which lose some of the image, so only the variants with the same ones
+# can be derived from the variant with them
+_LOSSY_PROFILE_SETTINGS = ('strip', 'sampling_factor')
+
+
+def _can_derive(variant_format, variant_quality, variant_profile, img_format, quality, profile):
+    if variant_format not in _LOSSLESS_FORMATS and (variant_format != img_format or variant_quality < quality):
+        return False
+    return all(not variant_profile.get(setting) or variant_profile.get(setting) == profile.get(setting)
+               for setting in _LOSSY_PROFILE_SETTINGS)
+
+
+def _target_size(width, height, source_width, source_height):
+    width, height = width or 0, height or 0
+    if width == 0:
+        return source_width * height / source_height, height
+    if height == 0:
+        return width, source_height * width / source_width
+    return width, height
+
+
+class VariantIndex(object):
+    """An index of the generated variants of each source image, kept in the cache store
+
+    Only the variants preserving the aspect ratio of the source image are indexed,
+    so the smaller ones can be derived from them instead of the source image.
+    A variant derives only the ones of the same format and the same or higher quality, unless it is lossless,
+    and never the ones keeping what its encode profile dropped, e.g. the metadata or the chroma resolution.
+    Each variant is a field of the index of the source image, so the concurrent generations never lose each other's
+    """
+
+    KEY_PREFIX = 'variant-index:'
+
+    def __init__(self, cache_store, max_variants=32):
+        self.cache_store = cache_store
+        self.max_variants = max_variants
+
+    def add(self, path, filename, size, img_format, quality, profile):
+        """Add the generated variant
+
+        :param img_format: The canonical format of the variant, e.g. jpg for jpeg
+        :param profile: The settings of the encode profile which affect the format
+        """
+        key = self.KEY_PREFIX + path
+        self.cache_store.set_field(key, filename, [size[0], size[1], img_format, quality, profile, time.time()])
+        variants = self.cache_store.get_fields(key)
+        if len(variants) > self.max_variants:
+            # Forgets the oldest ones
+            oldest = sorted(variants, key=lambda name: variants[name][-1])[:len(variants) - self.max_variants]
+            self.cache_store.delete_fields(key, oldest)
+
+    def find(self, path, width, height, img_format, quality, profile, min_scale):
+        """Find the smallest variant which is large enough to derive the given resized one
+
+        :param width: The width of the resized one, 0 or None to preserve the aspect ratio
+        :param height: The height of the resized one, 0 or None to preserve the aspect ratio
+        :param min_scale: How many times the variant has to be larger than the derived one
+        :param img_format: The canonical format of the derived one
+        :param quality: The lossy variant must have been encoded with this quality or higher
+        :param profile: The settings of the encode profile of the derived one which affect the format
+        :return: The filename of the variant, None if there is no such variant
+        """
+        candidates = []
+        for filename, (variant_width, variant_height, variant_format, variant_quality, variant_profile, _) in \
+                self.cache_store.get_fields(self.KEY_PREFIX + path).items():
+            if not _can_derive(variant_format, variant_quality, variant_profile, img_format, quality, profile):
+                continue
+            target_width, target_height = _target_size(width, height, variant_width, variant_height)
+            if variant_width >= target_width * min_scale and variant_height >= target_height * min_scale:
+                candidates.append((variant_width * variant_height, filename))
+        return min(candidates)[1] if candidates else None
@@ -0,0 +1,256 @@
+"""Set up the cache store, storages and executors of the app from its config"""
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from fitter import fitter
+from fitter.cachestore.inmemory import InMemoryStore
+from fitter.cachestore.lease import GenerationLease
+from fitter.cachestore.negative import InMemoryNegativeCache
+from fitter.cachestore.negative import RedisNegativeCache
+from fitter.cachestore.redis import RedisStore
+from fitter.cachestore.tiered import TieredStore
+from fitter.cachestore.variants import VariantIndex
+from fitter.engine.executor import TransformExecutor
+from fitter.engine.image import ENCODE_PROFILE_SETTINGS
+from fitter.engine.image import ENCODE_PROFILES
+from fitter.engine.image import encodable_formats
+from fitter.jobqueue.inmemory import InMemoryJobQueue
+from fitter.jobqueue.redis import RedisJobQueue
+from fitter.jobqueue.worker import JobWorker
+from fitter.server.paramset import ParamSet
+from fitter.storage.fs import FileSystemSourceStorage
+from fitter.storage.fs import FileSystemStoreStorage
+from fitter.storage.fs import LocalFileSystemStoreStorage
+from fitter.storage.index import BloomFilter
+from fitter.storage.index import IndexedStoreStorage
+from fitter.storage.s3 import S3SourceStorage
+from fitter.storage.s3 import S3StoreStorage
+from fitter.storage.sourcecache import CachedSourceStorage
+from fitter.storage.writebehind import WriteBehindStoreStorage
+from fitter.utils.metrics import metrics
+from fitter.utils.print import eprint
+from fitter.utils.singleflight import SingleFlight
+from fitter.views.pipeline import run_job
+
+
+_is_created = False
+
+
+def _set_file_system_storage(storage_class, storage_config):
+    return storage_class(
+        storage_config['LOCATION'],
+        base_url=storage_config.get('BASE_URL'),
+    )
+
+
+def _set_s3_storage(storage_class, storage_config, **kwargs):
+    return storage_class(
+        storage_config['AWS_ACCESS_KEY_ID'],
+        storage_config['AWS_SECRET_ACCESS_KEY'],
+        storage_config['BUCKET_NAME'],
+        storage_config['BUCKET_REGION'],
+        storage_config['LOCATION'],
+        **kwargs
+    )
+
+
+
+def _set_up_params():
+    fitter.auto_formats = encodable_formats(fitter.config['OPTIONS']['AUTO_FORMATS'])
+    fitter.encode_profiles = dict(ENCODE_PROFILES, **fitter.config['OPTIONS']['ENCODE_PROFILES'])
+
+    ParamSet.set_encodable_formats(encodable_formats(ParamSet.AVAILABLE_FORMATS))
+    if fitter.config['OPTIONS']['AUTO_FALLBACK_FORMAT'] not in set(ParamSet.AVAILABLE_FORMATS) - {'auto'}:
+        eprint('The fallback format of \'auto\' must be one of {} which your ImageMagick can encode'.format(
+            tuple(img_format for img_format in ParamSet.AVAILABLE_FORMATS if img_format != 'auto')))
+        sys.exit(-1)
+
+    for name, settings in fitter.encode_profiles.items():
+        if not isinstance(settings, dict) or not set(settings) <= set(ENCODE_PROFILE_SETTINGS):
+            eprint('The settings of the encode profile \'{}\' must be some of {}'.format(
+                name, ENCODE_PROFILE_SETTINGS))
+            sys.exit(-1)
+    if fitter.config['OPTIONS']['DEFAULT_ENCODE_PROFILE'] not in fitter.encode_profiles:
+        eprint('The default encode profile must be one of {}'.format(tuple(sorted(fitter.encode_profiles))))
+        sys.exit(-1)
+    ParamSet.set_encode_profiles(fitter.encode_profiles, fitter.config['OPTIONS']['DEFAULT_ENCODE_PROFILE'])
+
+    if fitter.config['OPTIONS']['SIZE_POLICY'] not in ParamSet.AVAILABLE_SIZE_POLICIES:
+        eprint('The size policy must be one of {}'.format(ParamSet.AVAILABLE_SIZE_POLICIES))
+        sys.exit(-1)
+    ParamSet.set_allowed_sizes(fitter.config['OPTIONS']['ALLOWED_SIZES'], fitter.config['OPTIONS']['SIZE_POLICY'])
+    ParamSet.set_presets(fitter.config['OPTIONS']['PRESETS'])
+    # The presets are validated once here, so the requests can not be failed by a broken one
+    for name, params in ParamSet.PRESETS.items():
+        if not isinstance(params, dict):
+            eprint('The preset \'{}\' must be the GET params'.format(name))
+            sys.exit(-1)
+        preset = ParamSet.from_preset(name, '')
+        if not preset.validate():
+            eprint('The preset \'{}\' is invalid: {}'.format(name, preset.errors))
+            sys.exit(-1)
+
+
+def _set_up_cache_store():
+    """Set up the cache store and what is kept on it
+
+    :return: The redis store if the cache store is redis (or tiered), None otherwise
+    """
+    cache_store_config = fitter.config['CACHE_STORE'] or {}
+    redis_store = None
+
+    if cache_store_config.get('TYPE') in ('redis', 'tiered'):
+        redis_store = RedisStore(
+            cache_store_config['HOST'],
+            cache_store_config['PORT'],
+            cache_store_config['DB'],
+            cache_store_config['PASSWORD'],
+            max_connections=cache_store_config['MAX_CONNECTIONS'],
+            socket_timeout=cache_store_config['SOCKET_TIMEOUT'],
+            socket_connect_timeout=cache_store_config['SOCKET_CONNECT_TIMEOUT'],
+            socket_keepalive=cache_store_config['SOCKET_KEEPALIVE'],
+            ttl=cache_store_config['TTL'],
+        )
+        if cache_store_config['TYPE'] == 'tiered':
+            fitter.cache_store = TieredStore(
+                redis_store,
+                InMemoryStore(
+                    max_entries=cache_store_config['NEAR_MAX_ENTRIES'],
+                    ttl=cache_store_config['NEAR_TTL'],
+                ),
+            )
+            metrics.register_memory_cache('near_cache', fitter.cache_store.near_store)
+        else:
+            fitter.cache_store = redis_store
+        if cache_store_config['GENERATION_LEASE']:
+            fitter.generation_lease = GenerationLease(
+                redis_store,
+                ttl=cache_store_config['LEASE_TTL'],
+                poll_interval=cache_store_config['LEASE_POLL_INTERVAL'],
+            )
+        if cache_store_config['NEGATIVE_TTL']:
+            fitter.negative_cache = RedisNegativeCache(
+                redis_store,
+                max_entries=cache_store_config['NEGATIVE_MAX_ENTRIES'],
+                ttl=cache_store_config['NEGATIVE_TTL'],
+            )
+        # The jobs are shared by all the nodes on the same redis
+        fitter.job_queue = RedisJobQueue(redis_store, status_ttl=fitter.config['OPTIONS']['JOB_STATUS_TTL'])
+    elif cache_store_config.get('TYPE') == 'in-memory':
+        fitter.cache_store = InMemoryStore(
+            max_entries=cache_store_config['MAX_ENTRIES'],
+            max_bytes=cache_store_config['MAX_BYTES'],
+            ttl=cache_store_config['TTL'],
+        )
+        metrics.register_memory_cache('cache_store', fitter.cache_store)
+        if cache_store_config['NEGATIVE_TTL']:
+            fitter.negative_cache = InMemoryNegativeCache(
+                max_entries=cache_store_config['NEGATIVE_MAX_ENTRIES'],
+                ttl=cache_store_config['NEGATIVE_TTL'],
+            )
+            metrics.register_memory_cache('negative_cache', fitter.negative_cache.store)
+
+    if fitter.job_queue is None:
+        fitter.job_queue = InMemoryJobQueue(status_ttl=fitter.config['OPTIONS']['JOB_STATUS_TTL'])
+
+    if fitter.cache_store is not None and fitter.config['OPTIONS']['DERIVE_VARIANTS']:
+        fitter.variant_index = VariantIndex(fitter.cache_store)
+    return redis_store
+
+
+def _set_up_storages(redis_store):
+    source_storage_config = fitter.config['SOURCE_STORAGE']
+    store_storage_config = fitter.config['STORE_STORAGE']
+
+    if source_storage_config['TYPE'] == 'fs':
+        fitter.source_storage = _set_file_system_storage(FileSystemSourceStorage, source_storage_config)
+    elif source_storage_config['TYPE'] == 's3':
+        fitter.source_storage = _set_s3_storage(S3SourceStorage, source_storage_config)
+
+    if source_storage_config['CACHE_LOCATION']:
+        fitter.source_storage = CachedSourceStorage(
+            fitter.source_storage,
+            source_storage_config['CACHE_LOCATION'],
+            source_storage_config['CACHE_MAX_BYTES'],
+            revalidate_after=source_storage_config['CACHE_REVALIDATE_AFTER'],
+        )
+
+    if store_storage_config['TYPE'] == 'fs':
+        if store_storage_config['DIRECT']:
+            fitter.store_storage = LocalFileSystemStoreStorage(
+                store_storage_config['LOCATION'],
+                base_url=store_storage_config.get('BASE_URL'),
+                root=store_storage_config['ROOT'],
+            )
+        else:
+            fitter.store_storage = _set_file_system_storage(FileSystemStoreStorage, store_storage_config)
+    elif store_storage_config['TYPE'] == 's3':
+        fitter.store_storage = _set_s3_storage(
+            S3StoreStorage,
+            store_storage_config,
+            multipart_threshold=store_storage_config['MULTIPART_THRESHOLD'],
+            multipart_concurrency=store_storage_config['MULTIPART_CONCURRENCY'],
+        )
+
+    if store_storage_config['WRITE_BEHIND']:
+        fitter.store_storage = WriteBehindStoreStorage(
+            fitter.store_storage,
+            max_backlog=store_storage_config['WRITE_BEHIND_BACKLOG'],
+            threads=store_storage_config['WRITE_BEHIND_THREADS'],
+            max_memory_bytes=store_storage_config['WRITE_BEHIND_MAX_MEMORY_BYTES'],
+        )
+
+    if store_storage_config['INDEX']:
+        if store_storage_config['INDEX_SHARED'] and redis_store is None:
+            eprint('The shared index of the store storage needs the redis (or tiered) cache store')
+            sys.exit(-1)
+        fitter.store_storage = IndexedStoreStorage(
+            fitter.store_storage,
+            BloomFilter(store_storage_config['INDEX_CAPACITY'], store_storage_config['INDEX_ERROR_RATE']),
+            redis_store=redis_store if store_storage_config['INDEX_SHARED'] else None,
+        )
+
+
+def create_app(job_workers=True):
+    """Set up the cache store, storages and executors of the app from its config, only once
+
+    The entry points (run.py, wsgi.py, the async app and warmup.py) call it explicitly. The spawned workers
+    of the transform executor import the modules of the app again, but never call it, so they never set up
+    the app nor spawn the workers of their own
+
+    :param job_workers: Whether if start the threads generating the images queued by the show action,
+                        as many as the job_workers option
+    :return: The app
+    """
+    global _is_created
+    if _is_created:
+        return fitter
+    fitter.cache_store = None
+    fitter.source_storage = None
+    fitter.store_storage = None
+    fitter.single_flight = SingleFlight()
+    fitter.generation_lease = None
+    fitter.negative_cache = None
+    fitter.variant_index = None
+    fitter.transform_executor = None
+    fitter.job_queue = None
+    fitter.upload_executor = ThreadPoolExecutor(max_workers=fitter.config['OPTIONS']['BATCH_UPLOAD_THREADS'])
+
+    _set_up_params()
+    redis_store = _set_up_cache_store()
+
+    if fitter.config['OPTIONS']['TRANSFORM_WORKERS']:
+        fitter.transform_executor = TransformExecutor(
+            fitter.config['OPTIONS']['TRANSFORM_WORKERS'],
+            max_queue=fitter.config['OPTIONS']['TRANSFORM_QUEUE_SIZE'],
+            timeout=fitter.config['OPTIONS']['TRANSFORM_TIMEOUT'],
+            max_jobs_per_worker=fitter.config['OPTIONS']['TRANSFORM_MAX_JOBS_PER_WORKER'],
+        )
+
+    _set_up_storages(redis_store)
+
+    # Started here, so they run under any WSGI or ASGI server, not only run.py
+    if job_workers and fitter.config['OPTIONS']['JOB_WORKERS']:
+        JobWorker(fitter.job_queue, run_job, threads=fitter.config['OPTIONS']['JOB_WORKERS']).start()
+    _is_created = True
+    return fitter
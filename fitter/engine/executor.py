@@ -0,0 +1,162 @@
+import io
+import multiprocessing
+import queue
+import threading
+
+from fitter.engine.image import transform_many
+from fitter.utils.metrics import metrics
+from fitter.utils.metrics import start_timings
+from fitter.utils.metrics import stop_timings
+from fitter.utils.print import eprint
+
+# The name of the worker processes
+TRANSFORM_WORKER_NAME = 'fitter-transform-worker'
+
+# Seconds between the retries of respawning the workers failed to be respawned
+RESPAWN_INTERVAL = 1
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+class TransformTimeout(Exception):
+    pass
+
+
+class TransformError(Exception):
+    pass
+
+
+def _work(connection):
+    while True:
+        try:
+            image_bytes, param_sets = connection.recv()
+        except EOFError:
+            return
+        # The timings of the stages are sent back with the result, as the metrics of this process are not exposed
+        token = start_timings()
+        try:
+            transformed = transform_many(io.BytesIO(image_bytes), param_sets)
+            result = [(img_file.getvalue(), size) for img_file, size in transformed], None
+        except Exception as e:
+            # The exceptions of wand are not always picklable
+            result = None, '{}: {}'.format(type(e).__name__, e)
+        connection.send(result + (stop_timings(token),))
+
+
+class _Worker(object):
+    def __init__(self, context):
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(target=_work, args=(worker_connection,), name=TRANSFORM_WORKER_NAME,
+                                       daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.jobs = 0
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+
+class TransformExecutor(object):
+    """A pool of worker processes transforming the images
+
+    The workers are killed and respawned if a job exceeds the timeout, and recycled after max_jobs_per_worker
+    jobs to contain the memory growth of ImageMagick. They are spawned instead of forked, as forking the process
+    with the other threads running may copy the locks held by them, e.g. the one of the metrics.
+    The workers failed to be respawned are retried on the next jobs
+
+    :param workers: The number of worker processes
+    :param max_queue: The maximum number of jobs waiting for a worker. Raises ExecutorBusy over it
+    :param timeout: Seconds to wait for a job to be done
+    :param max_jobs_per_worker: The number of jobs after which a worker is replaced with a new one
+    """
+
+    def __init__(self, workers, max_queue=16, timeout=30, max_jobs_per_worker=100):
+        self.context = multiprocessing.get_context('spawn')
+        self.timeout = timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.slots = threading.BoundedSemaphore(workers + max_queue)
+        self.idle_workers = queue.Queue()
+        self.lock = threading.Lock()
+        self.missing_workers = 0
+        for _ in range(workers):
+            self.idle_workers.put(_Worker(self.context))
+
+    def _spawn(self):
+        """Spawn a worker, or count it to be respawned later if failed
+
+        :return: The worker, None if failed
+        """
+        try:
+            return _Worker(self.context)
+        except Exception as e:
+            eprint('Failed to spawn the transform worker: {}'.format(e))
+            with self.lock:
+                self.missing_workers += 1
+            return None
+
+    def _respawn_missing(self):
+        with self.lock:
+            missing_workers, self.missing_workers = self.missing_workers, 0
+        for _ in range(missing_workers):
+            worker = self._spawn()
+            if worker is not None:
+                self.idle_workers.put(worker)
+
+    def _get_idle_worker(self):
+        while True:
+            self._respawn_missing()
+            try:
+                # Waits with the timeout to retry the respawning, in case that all the workers are missing
+                return self.idle_workers.get(timeout=RESPAWN_INTERVAL)
+            except queue.Empty:
+                pass
+
+    def _run(self, worker, job):
+        worker.connection.send(job)
+        if not worker.connection.poll(self.timeout):
+            raise TransformTimeout('Timed out transforming the image in {} seconds'.format(self.timeout))
+        return worker.connection.recv()
+
+    def transform(self, mode, image_obj, param_set):
+        """Transform the image on a worker process
+
+        :return: The encoded image file and its (width, height)
+        """
+        return self.transform_many(image_obj, [param_set])[0]
+
+    def transform_many(self, image_obj, param_sets):
+        """Transform the image into the several variants on a worker process, decoding it only once
+
+        :return: The list of the encoded image file and its (width, height) of each param set
+        """
+        if not self.slots.acquire(blocking=False):
+            raise ExecutorBusy('Too many images are waiting to be transformed')
+        try:
+            worker = self._get_idle_worker()
+            try:
+                transformed, error, timings = self._run(worker, (image_obj.read(), param_sets))
+                worker.jobs += 1
+            except TransformTimeout:
+                # Replaces the stuck worker
+                worker.jobs = self.max_jobs_per_worker
+                raise
+            except (EOFError, OSError):
+                worker.jobs = self.max_jobs_per_worker
+                raise TransformError('The worker died while transforming the image')
+            finally:
+                if worker.jobs >= self.max_jobs_per_worker:
+                    worker.kill()
+                    worker = self._spawn()
+                if worker is not None:
+                    self.idle_workers.put(worker)
+        finally:
+            self.slots.release()
+        for stage, seconds in timings:
+            metrics.record(stage, seconds)
+        if error is not None:
+            raise TransformError(error)
+        return [(io.BytesIO(image_bytes), size) for image_bytes, size in transformed]
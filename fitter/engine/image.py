@@ -1,15 +1,111 @@
+import ctypes
 import io
 
+from wand.api import library
+from wand.compat import binary
 from wand.image import Image
 
-
-def _thumbnail(image_obj, width, height, **options):
+from fitter.utils.metrics import metrics
+
+# The decoder keeps at least this many times of the target size when decoding at a reduced scale,
+# so the final resampling still has enough pixels to keep the quality
+SHRINK_ON_LOAD_MARGIN = 2
+
+# The built-in encode profiles, which the ones of the config are merged over
+ENCODE_PROFILES = {
+    'none': {},
+    'web': {
+        'strip': True,
+        'progressive': True,
+        'sampling_factor': '4:2:0',
+        'png_compression_level': 9,
+    },
+    'small': {
+        'strip': True,
+        'progressive': True,
+        'sampling_factor': '4:2:0',
+        'png_compression_level': 9,
+        'palette': True,
+    },
+}
+
+ENCODE_PROFILE_SETTINGS = (
+    'strip', 'progressive', 'sampling_factor', 'png_compression_level', 'palette',
+)
+
+# InterlaceType of the ImageMagick. The plane interlace makes the progressive JPEG
+_PLANE_INTERLACE = 3
+
+# Not bound by the wand
+library.MagickSetInterlaceScheme.argtypes = [ctypes.c_void_p, ctypes.c_int]
+
+
+def _can_encode(img_format):
+    try:
+        with Image(width=1, height=1) as img:
+            img.format = img_format
+            img.make_blob()
+    except Exception:
+        return False
+    return True
+
+
+def encodable_formats(img_formats):
+    """Filter the formats which the ImageMagick can encode, e.g. avif needs it to be built with libheif
+
+    Each of them is tried on a 1x1 image, as the formats listed by the ImageMagick include the decode-only ones
+    """
+    return [img_format for img_format in img_formats if _can_encode(img_format)]
+
+
+def _decode(image_obj, width=0, height=0):
+    """Decode the image, at a reduced scale if the decoder supports it (e.g. JPEG DCT scaling)
+
+    The decoder never scales the image below the given size times SHRINK_ON_LOAD_MARGIN.
+    If the width or height is 0, it is bounded by the other one
+    """
+    img = Image()
+    try:
+        if width or height:
+            hint_width = (width or height) * SHRINK_ON_LOAD_MARGIN
+            hint_height = (height or width) * SHRINK_ON_LOAD_MARGIN
+            library.MagickSetOption(img.wand, b'jpeg:size', binary('{}x{}'.format(hint_width, hint_height)))
+        img.read(file=image_obj)
+    except Exception:
+        img.close()
+        raise
+    return img
+
+
+def _apply_profile(img, img_format, strip=False, progressive=False, sampling_factor=None,
+                   png_compression_level=None, palette=False):
+    """Apply the settings of the encode profile, each of which only affects the formats supporting it"""
+    if strip:
+        img.strip()
+    if img_format == 'jpg' or img_format == 'jpeg':
+        if progressive:
+            library.MagickSetInterlaceScheme(img.wand, _PLANE_INTERLACE)
+        if sampling_factor:
+            img.options['jpeg:sampling-factor'] = sampling_factor
+    if img_format == 'png':
+        if png_compression_level is not None:
+            library.MagickSetOption(img.wand, b'png:compression-level', binary(str(png_compression_level)))
+        if palette:
+            img.type = 'palettematte' if img.alpha_channel else 'palette'
+
+
+def _encode(img, **options):
     img_format = options['format']
     quality = options['quality']
 
-    img_file = io.BytesIO()
+    img.format = img_format
+    img.compression_quality = quality
+    _apply_profile(img, img_format, **options.get('profile', {}))
+    # The BytesIO shares the blob instead of copying it like img.save(file=...)
+    return io.BytesIO(img.make_blob())
+
 
-    img = Image(file=image_obj)
+def _thumbnail(img, width, height, **options):
     original_width, original_height = img.size
     new_width, new_height = width, height
     # Preserves the aspect ratio fit to new height
@@ -24,21 +120,11 @@ def _thumbnail(image_obj, width, height, **options):
         img.transform(str(new_width) + 'x' + str(new_height) + '<')
     else:
         img.transform(str(new_width) + 'x' + str(new_height) + '>')
-    img.format = img_format
-    img.compression_quality = quality
-    img.save(file=img_file)
-    img_file.seek(0)
-    return img_file
 
 
-def _resize(image_obj, width, height, **options):
-    img_format = options['format']
+def _resize(img, width, height, **options):
     upscale = options['upscale']
-    quality = options['quality']
-
-    img_file = io.BytesIO()
 
-    img = Image(file=image_obj)
     original_width, original_height = img.size
     new_width, new_height = width, height
     # Stretchs or fits the width with desired width
@@ -54,52 +140,88 @@ def _resize(image_obj, width, height, **options):
     if height == 0:
         new_height = int(original_height * (new_width / original_width))
     img.resize(new_width, new_height)
-    img.format = img_format
-    img.compression_quality = quality
-    img.save(file=img_file)
-    img_file.seek(0)
-    return img_file
 
 
-def _flip(image_obj, direction, **options):
-    img_format = options['format']
-    quality = options['quality']
-
-    img_file = io.BytesIO()
-
-    img = Image(file=image_obj)
+def _flip(img, direction, **options):
     if direction == 'v':
         img.flip()
     if direction == 'h':
         img.flop()
-    img.format = img_format
-    img.compression_quality = quality
-    img.save(file=img_file)
-    img_file.seek(0)
-    return img_file
 
 
-def _rotate(image_obj, degree, **options):
-    img_format = options['format']
-    quality = options['quality']
+def _rotate(img, degree, **options):
+    img.rotate(degree)
 
-    img_file = io.BytesIO()
 
-    img = Image(file=image_obj)
-    img.rotate(degree)
-    img.format = img_format
-    img.compression_quality = quality
-    img.save(file=img_file)
-    img_file.seek(0)
-    return img_file
+def _apply(img, param_set):
+    for op in param_set.operations():
+        mode = op['mode']
+        if mode == 'thumbnail':
+            _thumbnail(img, op['width'], op['height'], **param_set.options)
+        if mode == 'resize':
+            _resize(img, op['width'], op['height'], **param_set.options)
+        if mode == 'flip':
+            _flip(img, op['direction'], **param_set.options)
+        if mode == 'rotate':
+            _rotate(img, op['degree'], **param_set.options)
+
+
+def _decoding_size(param_set):
+    """The size to decode the image at a reduced scale, which only the first resize operation can have
+
+    The thumbnail is cropped from the image at its full size, so it can not be decoded at a reduced scale
+
+    :return: (width, height), or None if the image must be decoded at its full size
+    """
+    op = param_set.operations()[0]
+    if op['mode'] == 'resize':
+        return op['width'] or op['height'], op['height'] or op['width']
+    return None
 
 
 def transform(mode, image_obj, param_set):
-    if mode == 'thumbnail':
-        return _thumbnail(image_obj, param_set.width, param_set.height, **param_set.options)
-    if mode == 'resize':
-        return _resize(image_obj, param_set.width, param_set.height, **param_set.options)
-    if mode == 'flip':
-        return _flip(image_obj, param_set.direction, **param_set.options)
-    if mode == 'rotate':
-        return _roate(image_obj, param_set.degree, **param_set.options)
+    """Transform the image with the given mode and params
+
+    The operations of the chain mode run on a single decoded image with a single encoding
+
+    :return: The encoded image file and its (width, height)
+    """
+    size = _decoding_size(param_set)
+    with metrics.timed('decode'):
+        if size is not None:
+            img = _decode(image_obj, *size)
+        else:
+            img = _decode(image_obj)
+    # Releases the memory of ImageMagick right away instead of waiting for the GC
+    with img:
+        return _transform_decoded(img, param_set)
+
+
+def _transform_decoded(img, param_set):
+    with metrics.timed('transform'):
+        _apply(img, param_set)
+    with metrics.timed('encode'):
+        return _encode(img, **param_set.options), img.size
+
+
+def transform_many(image_obj, param_sets):
+    """Transform the image into the several variants, decoding it only once
+
+    The reduced scale of decoding is bounded by the largest variant
+
+    :return: The list of the encoded image file and its (width, height) of each param set
+    """
+    sizes = [_decoding_size(param_set) for param_set in param_sets]
+    with metrics.timed('decode'):
+        if None not in sizes:
+            original_img = _decode(image_obj, max(width for width, _ in sizes), max(height for _, height in sizes))
+        else:
+            original_img = _decode(image_obj)
+    transformed = []
+    with original_img:
+        for param_set in param_sets[:-1]:
+            with original_img.clone() as img:
+                transformed.append(_transform_decoded(img, param_set))
+        # The last one is transformed on the decoded image itself, so a single variant is never copied
+        transformed.append(_transform_decoded(original_img, param_sets[-1]))
+    return transformed
@@ -0,0 +1,116 @@
+import ctypes
+import io
+import struct
+
+from wand.api import library
+from wand.image import Image
+
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Not bound by the wand
+library.MagickPingImageBlob.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t]
+library.MagickPingImageBlob.restype = ctypes.c_int
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+def _probe_jpeg(data):
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            # Fill byte
+            offset += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from('>HH', data, offset + 5)
+            return width, height
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            offset += 2
+            continue
+        offset += 2 + struct.unpack_from('>H', data, offset + 2)[0]
+    return None
+
+
+def _probe_webp(data):
+    chunk = bytes(data[12:16])
+    if chunk == b'VP8 ' and len(data) >= 30:
+        width, height = struct.unpack_from('<HH', data, 26)
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25:
+        bits = struct.unpack_from('<I', data, 21)[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def probe_size(data):
+    """Find the (width, height) of the single frame image from its header without decoding it
+
+    The GIF is not probed, as its frames may be larger than the size in its header
+
+    :param data: The bytes-like object of the image
+    :return: (width, height) of PNG, JPEG, WebP or BMP. None if unknown
+    """
+    data = memoryview(data)
+    signature = bytes(data[:12])
+    if signature.startswith(b'\x89PNG\r\n\x1a\n') and len(data) >= 24:
+        return struct.unpack_from('>II', data, 16)
+    if signature.startswith(b'\xff\xd8'):
+        return _probe_jpeg(data)
+    if signature.startswith(b'RIFF') and signature[8:12] == b'WEBP':
+        return _probe_webp(data)
+    if signature.startswith(b'BM') and len(data) >= 26:
+        width, height = struct.unpack_from('<ii', data, 18)
+        return width, abs(height)
+    return None
+
+
+def ping_pixels(data):
+    """Count the pixels of all the frames of the image with ImageMagick, reading only their headers
+
+    :param data: The bytes of the image
+    :return: The sum of width * height of the frames. None if ImageMagick can not read the image
+    """
+    with Image() as img:
+        if not library.MagickPingImageBlob(img.wand, data, len(data)):
+            return None
+        pixels = 0
+        for index in range(library.MagickGetNumberImages(img.wand)):
+            library.MagickSetIteratorIndex(img.wand, index)
+            pixels += library.MagickGetImageWidth(img.wand) * library.MagickGetImageHeight(img.wand)
+        return pixels
+
+
+def read_limited(image_obj, max_bytes=0, max_pixels=0):
+    """Read the image and check its size before decoding it, to reject the decompression bombs
+
+    The size is probed from the header of the common formats, and pinged with ImageMagick for the others.
+    The image of the unknown size is rejected too
+
+    :param max_bytes: The maximum bytes of the image. 0 is unlimited
+    :param max_pixels: The maximum width * height of the image, of all the frames. 0 is unlimited
+    :return: The file object of the image on memory
+    """
+    data = image_obj.read(max_bytes + 1) if max_bytes else image_obj.read()
+    if max_bytes and len(data) > max_bytes:
+        raise ImageTooLarge('The image is larger than {} bytes'.format(max_bytes))
+    if max_pixels:
+        size = probe_size(data)
+        if size is not None:
+            pixels = size[0] * size[1]
+        else:
+            pixels = ping_pixels(data)
+            if pixels is None:
+                raise ImageTooLarge('The size of the image is unknown')
+        if pixels > max_pixels:
+            raise ImageTooLarge('The image of {} pixels is larger than {} pixels'.format(pixels, max_pixels))
+    # Shares the bytes without copying them
+    return io.BytesIO(data)
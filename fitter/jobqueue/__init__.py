@@ -0,0 +1,22 @@
+class JobQueue(object):
+    """Common interface for the queue of image generation jobs
+
+    The jobs are keyed by the hash of the image, so the same image is never queued twice at once
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    NOT_FOUND = 'not_found'
+    FAILED = 'failed'
+
+    def put(self, hashed, param_set):
+        raise NotImplementedError('You must implement this method')
+
+    def take(self, timeout=None):
+        raise NotImplementedError('You must implement this method')
+
+    def finish(self, hashed, status, error=None):
+        raise NotImplementedError('You must implement this method')
+
+    def get_status(self, hashed):
+        raise NotImplementedError('You must implement this method')
@@ -0,0 +1,48 @@
+import queue
+import threading
+
+from fitter.cachestore.inmemory import InMemoryStore
+from fitter.jobqueue import JobQueue
+from fitter.server.paramset import ParamSet
+
+
+class InMemoryJobQueue(JobQueue):
+    """A job queue in the process
+
+    :param status_ttl: Seconds to keep the status of the finished jobs
+    """
+
+    def __init__(self, max_statuses=100000, status_ttl=3600):
+        self.queue = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.statuses = InMemoryStore(max_entries=max_statuses, ttl=status_ttl)
+
+    def put(self, hashed, param_set):
+        with self.lock:
+            if hashed in self.pending:
+                return False
+            self.pending.add(hashed)
+        self.statuses.set(hashed, {'status': self.QUEUED})
+        self.queue.put((hashed, param_set.as_dict()))
+        return True
+
+    def take(self, timeout=None):
+        """Take a job and mark it as running
+
+        :return: (hash, param set) of the job, None if there is no job until the timeout
+        """
+        try:
+            hashed, params = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self.statuses.set(hashed, {'status': self.RUNNING})
+        return hashed, ParamSet.from_dict(params)
+
+    def finish(self, hashed, status, error=None):
+        self.statuses.set(hashed, {'status': status, 'error': error})
+        with self.lock:
+            self.pending.discard(hashed)
+
+    def get_status(self, hashed):
+        return self.statuses.get(hashed)
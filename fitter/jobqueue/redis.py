@@ -0,0 +1,53 @@
+import json
+
+from fitter.jobqueue import JobQueue
+from fitter.server.paramset import ParamSet
+
+
+class RedisJobQueue(JobQueue):
+    """A job queue on redis shared by all the nodes
+
+    :param status_ttl: Seconds to keep the status of the jobs
+    :param pending_ttl: Seconds until a queued or running job can be queued again, in case its worker died
+    """
+
+    QUEUE_KEY = 'jobs'
+    PENDING_KEY_PREFIX = 'job:pending:'
+    STATUS_KEY_PREFIX = 'job:status:'
+
+    def __init__(self, redis_store, status_ttl=3600, pending_ttl=600):
+        self.redis = redis_store.redis
+        self.status_ttl = status_ttl
+        self.pending_ttl = pending_ttl
+
+    def _set_status(self, hashed, status, error=None):
+        self.redis.set(self.STATUS_KEY_PREFIX + hashed,
+                       json.dumps({'status': status, 'error': error}),
+                       ex=self.status_ttl)
+
+    def put(self, hashed, param_set):
+        if not self.redis.set(self.PENDING_KEY_PREFIX + hashed, 1, ex=self.pending_ttl, nx=True):
+            return False
+        self._set_status(hashed, self.QUEUED)
+        self.redis.lpush(self.QUEUE_KEY, json.dumps([hashed, param_set.as_dict()]))
+        return True
+
+    def take(self, timeout=None):
+        """Take a job and mark it as running
+
+        :return: (hash, param set) of the job, None if there is no job until the timeout
+        """
+        popped = self.redis.brpop(self.QUEUE_KEY, timeout=int(timeout or 0))
+        if popped is None:
+            return None
+        hashed, params = json.loads(popped[1].decode('utf8'))
+        self._set_status(hashed, self.RUNNING)
+        return hashed, ParamSet.from_dict(params)
+
+    def finish(self, hashed, status, error=None):
+        self._set_status(hashed, status, error)
+        self.redis.delete(self.PENDING_KEY_PREFIX + hashed)
+
+    def get_status(self, hashed):
+        status = self.redis.get(self.STATUS_KEY_PREFIX + hashed)
+        return json.loads(status.decode('utf8')) if status is not None else None
@@ -0,0 +1,46 @@
+import threading
+import time
+
+from fitter.jobqueue import JobQueue
+from fitter.utils.print import eprint
+
+
+class JobWorker(object):
+    """Threads draining the job queue
+
+    :param job_queue: The job queue to drain
+    :param run_job: The function called with (hash, param set) of each job, which returns the status of the job
+    :param threads: The number of threads
+    :param poll_timeout: Seconds to wait for a job at once
+    """
+
+    def __init__(self, job_queue, run_job, threads=1, poll_timeout=1):
+        self.job_queue = job_queue
+        self.run_job = run_job
+        self.threads = threads
+        self.poll_timeout = poll_timeout
+
+    def start(self):
+        for _ in range(self.threads):
+            threading.Thread(target=self._drain, daemon=True).start()
+
+    def _drain(self):
+        while True:
+            try:
+                job = self.job_queue.take(timeout=self.poll_timeout)
+            except Exception as e:
+                # e.g. The redis is not reachable for a while
+                eprint('Failed to take a job: {}'.format(e))
+                time.sleep(self.poll_timeout)
+                continue
+            if job is None:
+                continue
+            hashed, param_set = job
+            try:
+                status, error = self.run_job(hashed, param_set), None
+            except Exception as e:
+                status, error = JobQueue.FAILED, '{}: {}'.format(type(e).__name__, e)
+            try:
+                self.job_queue.finish(hashed, status, error)
+            except Exception as e:
+                eprint('Failed to finish the job {}: {}'.format(hashed, e))
@@ -1,15 +1,36 @@
 from functools import wraps
 
 from flask import g
-from flask import jsonify
 from flask import request
+from flask import Response
 
 from fitter import fitter
 from fitter.server.paramset import ParamSet
 from fitter.utils.file import generate_hash
+from fitter.utils.metrics import current_timings
+from fitter.utils.metrics import metrics
+from fitter.utils.metrics import server_timing
+from fitter.utils.metrics import start_timings
+from fitter.utils.metrics import stop_timings
+from fitter.views.action import batch_view
 from fitter.views.action import get_view
+from fitter.views.action import image_view
+from fitter.views.action import job_status_view
 from fitter.views.action import redirect_view
 from fitter.views.action import show_view
+from fitter.views.errors import error_response
+from fitter.views.errors import invalid_params
+
+# The actions of a single image, whose successful responses never change as the url is its hash
+_IMAGE_ENDPOINTS = ('generate_and_show', 'generate_and_get', 'generate_and_redirect', 'generate_and_stream')
+# The responses which change over time
+_UNCACHEABLE_ENDPOINTS = ('get_job_status', 'get_metrics')
+
+
+def _negotiate_format(param_set):
+    if param_set.negotiate_format(request.headers.get('Accept'), fitter.auto_formats,
+                                  fitter.config['OPTIONS']['AUTO_FALLBACK_FORMAT']):
+        g.format_negotiated = True
 
 
 def validate_params(api):
@@ -25,6 +46,7 @@ def validate_params(api):
                     - resize: Resizes the image with desired size
                     - flip: Flips the image with given direction
                     - rotate: Rotates the image with desired degree
+                    - chain: Runs the 'ops' in order. Can be omitted if the 'ops' is set
                 required
             path:
                 description: The path of image which is on source storage
@@ -36,6 +58,9 @@ def validate_params(api):
                     - png
                     - jpg
                     - jpeg
+                    - webp
+                    - avif
+                    - auto: The best one accepted by the Accept header
                 default: png
             width (w):
                 description: The desired width of the image
@@ -60,38 +85,33 @@ def validate_params(api):
             degree:
                 description: The desired degree to rotate the image
                 :type: float
+            ops:
+                description: The operations to run in order on a single decoded image, separated by '|'
+                :type: string
+                options:
+                    - thumbnail:<width>x<height>
+                    - resize:<width>x<height>
+                    - flip:<direction>
+                    - rotate:<degree>
+                e.g. rotate:90|thumbnail:200x0
+            profile:
+                description: The name of the encode profile, e.g. web or small
+                :type: string
+                default: The default encode profile of the config
+            preset:
+                description: The name of the preset. The other parameters except the path are taken from it
+                :type: string
     """
 
     @wraps(api)
     def validate_params_decorator(*args, **kwargs):
-        param_fetcher = request.args.get
-
-        mode = param_fetcher('mode')
-        path = param_fetcher('path')
-        img_fotmat = param_fetcher('format', 'png')
-        width = param_fetcher('width')
-        height = param_fetcher('height')
-        upscale = param_fetcher('upscale', 'true')
-        quality = param_fetcher('quality', '100')
-        direction = param_fetcher('direction')
-        degree = param_fetcher('degree')
-
-        param_set = ParamSet(
-            mode=mode,
-            path=path,
-            img_format=img_fotmat,
-            width=width,
-            height=height,
-            upscale=upscale,
-            quality=quality,
-            direction=direction,
-            degree=degree,
-        )
+        param_set = ParamSet.from_args(request.args)
 
         if param_set.validate():
+            _negotiate_format(param_set)
             g.param_set = param_set
             return api(*args, **kwargs)
-        return jsonify(errors=param_set.errors)
+        return error_response(invalid_params(param_set.errors))
     return validate_params_decorator
 
 
@@ -113,9 +133,9 @@ def upload():
 @fitter.route('/show', methods=['GET'])
 @validate_params
 def generate_and_show():
-    """Get the generated image information asynchronously
+    """Get the url of the image asynchronously
 
-    It is Useful when use in <img> tag
+    The image is generated on the background if not exists. It is Useful when use in <img> tag
     """
     param_set = g.param_set
     hashed = generate_hash(param_set)
@@ -139,3 +159,99 @@ def generate_and_redirect():
     param_set = g.param_set
     hashed = generate_hash(param_set)
     return redirect_view(hashed, param_set)
+
+
+@fitter.route('/image', methods=['GET'])
+@validate_params
+def generate_and_stream():
+    """Stream the generated image itself
+
+    The hash of the image is its ETag, so the cached image of the client is validated without any storage access
+    """
+    param_set = g.param_set
+    hashed = generate_hash(param_set)
+    # Only the concrete ETags (weak too, as If-None-Match compares weakly), not '*' which may match
+    # the image not generated yet
+    if request.if_none_match.is_strong(hashed) or request.if_none_match.is_weak(hashed):
+        response = Response(status=304)
+        response.set_etag(hashed)
+        return response
+    return image_view(hashed, param_set)
+
+
+@fitter.route('/batch', methods=['POST'])
+def generate_batch():
+    """Get the generated images information of the several variants of an image at once
+
+    The source image is fetched and decoded only once for all the variants. It is useful for srcset
+
+    post:
+        body (json):
+            path:
+                description: The path of image which is on source storage
+                :type: string
+            variants:
+                description: The list of the GET params of each variant except the path
+                :type: list
+    """
+    param_sets, errors = ParamSet.from_batch(request.get_json(force=True, silent=True),
+                                             fitter.config['OPTIONS']['BATCH_MAX_VARIANTS'])
+    if errors:
+        return error_response(invalid_params(errors))
+    for param_set in param_sets:
+        _negotiate_format(param_set)
+    return batch_view(param_sets)
+
+
+@fitter.route('/jobs/<hashed>', methods=['GET'])
+def get_job_status(hashed):
+    """Get the status of the image generation queued by the show action"""
+    return job_status_view(hashed)
+
+
+def get_metrics():
+    """Expose the metrics of this process in the Prometheus text format"""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+if fitter.config['OPTIONS']['ENABLE_METRICS']:
+    fitter.add_url_rule('/metrics', view_func=get_metrics, methods=['GET'])
+
+
+@fitter.before_request
+def start_request_metrics():
+    metrics.inc('fitter_requests_in_flight')
+    if fitter.config['OPTIONS']['SERVER_TIMING']:
+        g.timings_token = start_timings()
+
+
+@fitter.teardown_request
+def finish_request_metrics(exception):
+    metrics.dec('fitter_requests_in_flight')
+    if g.get('timings_token') is not None:
+        stop_timings(g.timings_token)
+
+
+@fitter.after_request
+def add_server_timing(response):
+    # Only the stages done in the request, not the streaming of the response after it
+    timings = current_timings()
+    if timings:
+        response.headers['Server-Timing'] = server_timing(timings)
+    return response
+
+
+@fitter.after_request
+def add_cache_control(response):
+    if request.endpoint in _UNCACHEABLE_ENDPOINTS:
+        response.headers['Cache-Control'] = 'no-store'
+    elif request.endpoint in _IMAGE_ENDPOINTS:
+        cache_control = fitter.config['OPTIONS']['CACHE_CONTROL']
+        # The responses which must not be cached set their own, e.g. the errors or the redirect to the image
+        # being uploaded
+        if cache_control is not None and response.status_code < 400 and 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = cache_control
+    # The caches must not serve the image chosen for the other clients
+    if g.get('format_negotiated'):
+        response.vary.add('Accept')
+    return response
@@ -4,13 +4,48 @@ class ParamSet:
     It validates the most of params with their restrictions. And also validate the required values for each mode
     """
     AVAILABLE_MODES = (
+        'thumbnail', 'resize', 'flip', 'rotate', 'chain',
+    )
+
+    # The modes which can be chained with 'ops'
+    AVAILABLE_OPS = (
         'thumbnail', 'resize', 'flip', 'rotate',
     )
 
+    MAX_OPS = 8
+
+    # Narrowed down to the ones the ImageMagick can encode by set_encodable_formats
     AVAILABLE_FORMATS = (
-        'jpg', 'jpeg', 'png',
+        'jpg', 'jpeg', 'png', 'webp', 'avif', 'auto',
+    )
+
+    FORMAT_MIMETYPES = {
+        'jpg': 'image/jpeg',
+        'jpeg': 'image/jpeg',
+        'png': 'image/png',
+        'webp': 'image/webp',
+        'avif': 'image/avif',
+    }
+
+    # The encode profiles selectable with 'profile', replaced with the ones of the config by set_encode_profiles
+    ENCODE_PROFILES = {
+        'none': {},
+    }
+
+    DEFAULT_ENCODE_PROFILE = 'none'
+
+    # The named params selectable with 'preset', set from the config by set_presets
+    PRESETS = {}
+
+    # The sizes allowed for the width and height, set from the config by set_allowed_sizes. Empty is unlimited
+    ALLOWED_SIZES = ()
+
+    AVAILABLE_SIZE_POLICIES = (
+        'snap', 'strict',
     )
 
+    SIZE_POLICY = 'snap'
+
     VALID_HORIZONTAL_DIRECTIONS = (
         'h', 'horizontal',
     )
@@ -28,7 +63,8 @@ class ParamSet:
     )
 
     def __init__(self, mode=None, path=None, img_format='png', width=None, height=None,
-                 upscale='true', quality='100', direction=None, degree=None):
+                 upscale='true', quality='100', direction=None, degree=None, ops=None, profile=None,
+                 preset=None):
         """Initialize the parameters for fitter server
 
         TODO: Supports external URL of an image as 'url' field
@@ -38,17 +74,29 @@ class ParamSet:
             - resize
             - flip
             - rotate
+            - chain: runs the 'ops' in order. It can be omitted if the 'ops' is set
         :param path: The path of image which is on source storage
         :param img_format: The desired format of image
             - png
             - jpg
             - jpeg
+            - webp
+            - avif
+            - auto: the best one accepted by the client, chosen by negotiate_format
         :param width: The desired width of image. If this value is 0, the aspect ratio of output image is preserved
         :param height: The desired height of image. If this value is 0, the aspect ratio of output image is preserved
         :param upscale: Whether if upscale the image has size smaller than desired size
         :param quality: The desired quality of image
         :param direction: The desired direction to flip the image
         :param degree: The desired degree to rotate the image
+        :param ops: The operations to run in order with a single decoding and encoding, separated by '|'
+            - thumbnail:<width>x<height>
+            - resize:<width>x<height>
+            - flip:<direction>
+            - rotate:<degree>
+            e.g. rotate:90|thumbnail:200x0
+        :param profile: The name of the encode profile. The default profile of the config if omitted
+        :param preset: The name of the preset the params are resolved from
         :return: None. But will set all params to itself
         """
 
@@ -63,6 +111,9 @@ class ParamSet:
         self.height = height
         self.direction = direction
         self.degree = degree
+        self.ops = ops
+        self.profile = profile
+        self.preset = preset
         self.img_format = img_format
         self.upscale = upscale
         self.quality = quality
@@ -73,7 +124,179 @@ class ParamSet:
         }
         self.errors = []
 
+    @classmethod
+    def from_args(cls, args):
+        """Create the param set from the GET params
+
+        With the 'preset', the params are taken from the preset except the 'path'
+
+        :param args: The mapping of GET params (e.g. request.args)
+        """
+        if args.get('preset') is not None:
+            return cls.from_preset(args['preset'], args.get('path'))
+        return cls._from_params(args)
+
+    @classmethod
+    def from_preset(cls, preset, path):
+        """Create the param set of the image on the path from the preset
+
+        :param preset: The name of the preset
+        :param path: The path of image which is on source storage
+        """
+        if preset not in cls.PRESETS:
+            return cls(path=path, preset=preset)
+        param_set = cls._from_params(dict(cls._stringify(cls.PRESETS[preset]), path=path))
+        param_set.preset = preset
+        return param_set
+
+    @staticmethod
+    def _stringify(params):
+        # The params are validated as the GET params, which are always strings
+        return {key: str(value).lower() if isinstance(value, bool) else str(value)
+                for key, value in params.items()}
+
+    @classmethod
+    def _from_params(cls, args):
+        return cls(
+            mode=args.get('mode'),
+            path=args.get('path'),
+            img_format=args.get('format', 'png'),
+            width=args.get('width'),
+            height=args.get('height'),
+            upscale=args.get('upscale', 'true'),
+            quality=args.get('quality', '100'),
+            direction=args.get('direction'),
+            degree=args.get('degree'),
+            ops=args.get('ops'),
+            profile=args.get('profile'),
+        )
+
+    @classmethod
+    def from_batch(cls, batch, max_variants):
+        """Create and validate the param sets of the variants of an image from the body of the batch action
+
+        {"path": "path/to/image", "variants": [{"mode": "thumbnail", "width": 300}, ...]}
+
+        :param batch: The decoded JSON body
+        :param max_variants: The maximum number of the variants
+        :return: The validated param sets and the errors
+        """
+        if not isinstance(batch, dict) or not isinstance(batch.get('variants'), list):
+            return [], ['You must specify the \'variants\' as a list']
+        if not batch['variants'] or len(batch['variants']) > max_variants:
+            return [], ['The number of \'variants\' must be in between 1 and {}'.format(max_variants)]
+        param_sets = []
+        errors = []
+        for index, variant in enumerate(batch['variants']):
+            if not isinstance(variant, dict):
+                errors.append('variants[{}]: Each variant must be an object'.format(index))
+                continue
+            args = cls._stringify(variant)
+            args['path'] = batch.get('path')
+            param_set = cls.from_args(args)
+            if param_set.validate():
+                param_sets.append(param_set)
+            else:
+                errors.extend('variants[{}]: {}'.format(index, error) for error in param_set.errors)
+        return param_sets, errors
+
+    @classmethod
+    def set_encodable_formats(cls, img_formats):
+        """Allow only the formats the ImageMagick can encode for 'format', e.g. avif needs it built with libheif
+
+        :param img_formats: The encodable ones of the available formats
+        """
+        cls.AVAILABLE_FORMATS = tuple(img_format for img_format in cls.AVAILABLE_FORMATS
+                                      if img_format == 'auto' or img_format in img_formats)
+
+    @classmethod
+    def set_encode_profiles(cls, profiles, default_profile):
+        """Set the encode profiles selectable with 'profile' and the one used if it is omitted
+
+        :param profiles: The dict of the name and the settings of each profile
+        :param default_profile: The name of the default profile
+        """
+        cls.ENCODE_PROFILES = profiles
+        cls.DEFAULT_ENCODE_PROFILE = default_profile
+
+    @classmethod
+    def set_presets(cls, presets):
+        """Set the presets selectable with 'preset'
+
+        :param presets: The dict of the name and the GET params (except the 'path') of each preset
+        """
+        cls.PRESETS = presets
+
+    @classmethod
+    def set_allowed_sizes(cls, sizes, policy):
+        """Set the sizes allowed for the width and height to bound the number of the variants
+
+        The presets are not bounded by them
+
+        :param sizes: The allowed sizes. Empty is unlimited
+        :param policy: What to do with the other sizes. One of followings
+            - snap: rounds it up to the nearest allowed size (down to the largest one if it is over all of them)
+            - strict: rejects it
+        """
+        cls.ALLOWED_SIZES = tuple(sorted(sizes))
+        cls.SIZE_POLICY = policy
+
+    def negotiate_format(self, accept, auto_formats, fallback_format):
+        """Choose the format of 'auto' from the Accept header of the client
+
+        Only the explicitly accepted formats are chosen, as the clients not supporting them also send */*
+
+        :param accept: The value of Accept header
+        :param auto_formats: The formats to choose in the order of preference
+        :param fallback_format: The format if none of them is accepted
+        :return: True if the format is chosen from the Accept header, so the response varies on it
+        """
+        if self.options['format'] != 'auto':
+            return False
+        accepted_mimetypes = set()
+        for accepted in (accept or '').split(','):
+            mimetype, *params = accepted.split(';')
+            quality = 1.0
+            for param in params:
+                name, _, value = param.strip().partition('=')
+                if name == 'q':
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        pass
+            if quality > 0:
+                accepted_mimetypes.add(mimetype.strip().lower())
+        self.img_format = fallback_format
+        for img_format in auto_formats:
+            if self.FORMAT_MIMETYPES.get(img_format) in accepted_mimetypes:
+                self.img_format = img_format
+                break
+        self.options['format'] = self.img_format
+        return True
+
+    def as_dict(self):
+        """Dump the validated params into a JSON serializable dict, e.g. to queue them as a job"""
+        return {key: value for key, value in self.__dict__.items() if key != 'errors'}
+
+    @classmethod
+    def from_dict(cls, params):
+        """Restore the validated param set dumped by as_dict, without validating it again"""
+        param_set = cls()
+        param_set.__dict__.update(params)
+        return param_set
+
+    def _validate_preset(self):
+        if self.preset is not None and self.preset not in self.PRESETS:
+            self.errors.append('The \'preset\' must be one of {}'.format(tuple(sorted(self.PRESETS))))
+            return False
+        return True
+
     def _validate_mode(self):
+        if self.ops is not None:
+            if self.mode not in (None, 'chain'):
+                self.errors.append('The \'mode\' must be \'chain\' or omitted with the \'ops\'')
+                return False
+            self.mode = 'chain'
         if self.mode is None:
             self.errors.append('You must specify the \'mode\'')
             return False
@@ -137,6 +360,15 @@ class ParamSet:
             return False
         return True
 
+    def _validate_profile(self):
+        if self.profile is None:
+            self.profile = self.DEFAULT_ENCODE_PROFILE
+        if self.profile not in self.ENCODE_PROFILES:
+            self.errors.append('The \'profile\' must be one of {}'.format(tuple(sorted(self.ENCODE_PROFILES))))
+            return False
+        self.options['profile'] = self.ENCODE_PROFILES[self.profile]
+        return True
+
     def _validate_direction(self):
         if self.direction is not None:
             if self.direction in self.VALID_HORIZONTAL_DIRECTIONS:
@@ -160,6 +392,78 @@ class ParamSet:
             return True
         return True
 
+    def _parse_op(self, op):
+        name, _, value = op.partition(':')
+        if name not in self.AVAILABLE_OPS:
+            self.errors.append('The operation of \'ops\' must be one of {}'.format(self.AVAILABLE_OPS))
+            return None
+        if name == 'thumbnail' or name == 'resize':
+            width, separator, height = value.partition('x')
+            if not separator or not width.isnumeric() or not height.isnumeric():
+                self.errors.append('The \'{}\' of \'ops\' must be like {}:<width>x<height>'.format(name, name))
+                return None
+            if int(width) == 0 and int(height) == 0:
+                self.errors.append('At least one of width or height of \'{}\' have to be positive'.format(name))
+                return None
+            return {'mode': name, 'width': int(width), 'height': int(height)}
+        if name == 'flip':
+            if value in self.VALID_HORIZONTAL_DIRECTIONS:
+                return {'mode': name, 'direction': 'h'}
+            if value in self.VALID_VERTICAL_DIRECTIONS:
+                return {'mode': name, 'direction': 'v'}
+            self.errors.append('The \'flip\' of \'ops\' must be like flip:<direction> of {}'.format(
+                self.VALID_HORIZONTAL_DIRECTIONS + self.VALID_VERTICAL_DIRECTIONS))
+            return None
+        if not value.isnumeric():
+            self.errors.append('The \'rotate\' of \'ops\' must be like rotate:<numeric degree>')
+            return None
+        return {'mode': name, 'degree': float(value)}
+
+    def _validate_ops(self):
+        if self.ops is not None:
+            ops = self.ops.split('|')
+            if len(ops) > self.MAX_OPS:
+                self.errors.append('At most {} operations are allowed for \'ops\''.format(self.MAX_OPS))
+                return False
+            parsed_ops = [self._parse_op(op) for op in ops]
+            if None in parsed_ops:
+                return False
+            self.ops = parsed_ops
+        return True
+
+    def operations(self):
+        """The operations to run in order, each of which is a dict of the mode and its params"""
+        if self.mode == 'chain':
+            return self.ops
+        if self.mode == 'thumbnail' or self.mode == 'resize':
+            return [{'mode': self.mode, 'width': self.width, 'height': self.height}]
+        if self.mode == 'flip':
+            return [{'mode': self.mode, 'direction': self.direction}]
+        return [{'mode': self.mode, 'degree': self.degree}]
+
+    def _bound_size(self, description, size):
+        """Snap the size to the allowed sizes, or None if it is rejected. 0 is always allowed"""
+        if not size or size in self.ALLOWED_SIZES:
+            return size
+        if self.SIZE_POLICY == 'strict':
+            self.errors.append('The {} must be 0 or one of {}'.format(description, self.ALLOWED_SIZES))
+            return None
+        for allowed_size in self.ALLOWED_SIZES:
+            if allowed_size >= size:
+                return allowed_size
+        return self.ALLOWED_SIZES[-1]
+
+    def _validate_allowed_sizes(self):
+        if not self.ALLOWED_SIZES or self.preset is not None:
+            return True
+        self.width = self._bound_size('\'width\'', self.width)
+        self.height = self._bound_size('\'height\'', self.height)
+        for op in self.ops or []:
+            if op['mode'] == 'thumbnail' or op['mode'] == 'resize':
+                op['width'] = self._bound_size('width of \'{}\' of \'ops\''.format(op['mode']), op['width'])
+                op['height'] = self._bound_size('height of \'{}\' of \'ops\''.format(op['mode']), op['height'])
+        return not self.errors
+
     def _validate_required_for_resizing(self):
         if self.width is None and self.height is None:
             self.errors.append('At least one of \'width\' or \'height\' have to be set')
@@ -175,6 +479,12 @@ class ParamSet:
             return False
         return True
 
+    def _validate_required_for_chaining(self):
+        if self.ops is None:
+            self.errors.append('The \'ops\' have to be set to chain the operations')
+            return False
+        return True
+
     def _validate_required_for_rotating(self):
         if self.degree is None:
             self.errors.append('The \'degree\' have to be set to rotate the image')
@@ -187,6 +497,8 @@ class ParamSet:
          :return: True if all validation is passed, False otherwise
         """
         # TODO: Validate the only required parameters for each mode
+        if not self._validate_preset():
+            return False
         basic_validated = all([self._validate_mode(),
                                self._validate_path(),
                                self._validate_foramt(),
@@ -194,10 +506,12 @@ class ParamSet:
                                self._validate_height(),
                                self._validate_upscale(),
                                self._validate_quality(),
+                               self._validate_profile(),
                                self._validate_direction(),
-                               self._validate_degree()])
-        if not basic_validated:
-            return basic_validated
+                               self._validate_degree(),
+                               self._validate_ops()])
+        if not basic_validated or not self._validate_allowed_sizes():
+            return False
         # Validate the required conditions for each mode
         if self.mode == 'thumbnail' or self.mode == 'resize':
             return self._validate_required_for_resizing()
@@ -205,3 +519,5 @@ class ParamSet:
             return self._validate_required_for_flipping()
         if self.mode == 'rotate':
             return self._validate_required_for_rotating()
+        if self.mode == 'chain':
+            return self._validate_required_for_chaining()
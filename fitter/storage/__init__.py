@@ -7,6 +7,17 @@ class SourceStorage(object):
     def get(self, key):
         raise NotImplementedError('You must implement this method')
 
+    def fetch(self, key, validator=None):
+        """Fetch the image in a single request unless it is not modified from the validator
+
+        :param validator: The validator (e.g. ETag or mtime) of the image fetched before
+        :return: None if the image does not exist, (None, validator) if it is not modified,
+                 (file object, validator) otherwise
+        """
+        if not self.exists(key):
+            return None
+        return self.get(key), None
+
 
 class StoreStorage(object):
     """Common interface for storage as store"""
@@ -20,8 +31,30 @@ class StoreStorage(object):
     def get_path(self, key):
         raise NotImplementedError('You must implement this method')
 
+    def list_keys(self):
+        """Iterate all the keys of the stored images in bulk, without a request for each key
+
+        Raises NotImplementedError if the storage can not be listed
+        """
+        raise NotImplementedError('You must implement this method')
+
     def save(self, key, file):
         raise NotImplementedError('You must implement this method')
 
+    def is_pending(self, key):
+        """Whether if the image is saved but not uploaded to the url yet, e.g. on the write behind store storage"""
+        return False
+
+    def when_uploaded(self, key, callback):
+        """Call the callback with whether if the saved image is uploaded, once its upload is done
+
+        The images are uploaded when saved unless they are pending, so it is called right away
+        """
+        callback(True)
+
+    def flush(self):
+        """Wait until all the pending images are uploaded"""
+        pass
+
     def generate_url(self, key):
         raise NotImplementedError('You must implement this method')
@@ -1,28 +1,25 @@
 from functools import wraps
 
-from flask import jsonify
-from flask import redirect
-
-from fitter import fitter
+from fitter.views.pipeline import is_stored
+from fitter.views.stream import get_image
+from fitter.views.stream import redirect_to_image
+from fitter.views.stream import show_image
+from fitter.views.stream import stream_image
 
 
 def from_store_storage(action):
     def from_store_storage_decorator(func):
         @wraps(func)
         def func_wrapper(hashed, param_set):
-            if fitter.store_storage.exists(key=hashed):
+            if is_stored(hashed):
                 if action == 'show':
-                    return jsonify(
-                        url=fitter.store_storage.generate_url(hashed)
-                    )
+                    return show_image(hashed)
                 if action == 'get':
-                    return jsonify(
-                        filename=hashed,
-                        path=fitter.store_storage.get_path(hashed),
-                        url=fitter.store_storage.generate_url(hashed),
-                    )
+                    return get_image(hashed)
                 if action == 'redirect':
-                    return redirect(fitter.store_storage.generate_url(hashed), code=302)
+                    return redirect_to_image(hashed)
+                if action == 'image':
+                    return stream_image(hashed)
             return func(hashed, param_set)
         return func_wrapper
     return from_store_storage_decorator
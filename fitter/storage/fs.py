@@ -1,10 +1,13 @@
 import io
 import os
+import shutil
+import tempfile
 
 import requests
 
 from fitter.storage import SourceStorage
 from fitter.storage import StoreStorage
+from fitter.utils.file import get_mimetype
 
 
 class FileSystemStorage(object):
@@ -28,6 +31,16 @@ class FileSystemSourceStorage(FileSystemStorage, SourceStorage):
         file_obj = open(os.path.join(self.location, key), 'rb')
         return file_obj
 
+    def fetch(self, key, validator=None):
+        path = os.path.join(self.location, key)
+        try:
+            mtime = str(os.stat(path).st_mtime_ns)
+        except OSError:
+            return None
+        if mtime == validator:
+            return None, validator
+        return open(path, 'rb'), mtime
+
 
 class FileSystemStoreStorage(FileSystemStorage, StoreStorage):
     def __init__(self, *args, **kwargs):
@@ -41,18 +54,18 @@ class FileSystemStoreStorage(FileSystemStorage, StoreStorage):
 
     def get(self, key):
         url = self.generate_url(key)
-        result = requests.get(url, stream=True)
-        with io.StringIO() as file_obj:
-            for chunk in result:
-                file_obj.write(chunk)
-            return file_obj
+        result = requests.get(url)
+        if result.status_code != 200:
+            raise Exception('Can\'t download the image {}'.format(key))
+        return io.BytesIO(result.content)
 
     def get_path(self, key):
         return os.path.join(self.cache_location,
                             key)
 
     def save(self, key, file):
-        files = {'file': (key, file.getvalue())}
+        content_type = get_mimetype(key)
+        files = {'file': (key, file, content_type)}
         result = requests.post(
             os.path.join(self.base_url, self.cache_location),
             files=files,
@@ -65,3 +78,51 @@ class FileSystemStoreStorage(FileSystemStorage, StoreStorage):
         return os.path.join(self.base_url,
                             self.cache_location,
                             key)
+
+
+class LocalFileSystemStoreStorage(FileSystemStoreStorage):
+    """A store storage which reads and writes the images directly on the local file system
+
+    It has the same layout as the file system store storage, but writes the images directly
+    to the root directory served on the base_url instead of uploading them to it
+
+    :param root: The directory served on the base_url
+    """
+
+    def __init__(self, location, base_url=None, root=None):
+        super(LocalFileSystemStoreStorage, self).__init__(location, base_url=base_url)
+        self.root = root
+        self.directory = os.path.join(self.root, self.cache_location)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _get_file_path(self, key):
+        return os.path.join(self.directory, key)
+
+    def exists(self, key):
+        try:
+            os.stat(self._get_file_path(key))
+            return True
+        except OSError:
+            return False
+
+    def get(self, key):
+        return open(self._get_file_path(key), 'rb')
+
+    def list_keys(self):
+        for entry in os.scandir(self.directory):
+            # Skips the temp files being written
+            if not entry.name.startswith('.') and entry.is_file():
+                yield entry.name
+
+    def save(self, key, file):
+        # Writes to a temp file and renames it, so the readers never see a partially written image
+        fd, temp_path = tempfile.mkstemp(prefix='.' + key, dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                shutil.copyfileobj(file, temp_file)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self._get_file_path(key))
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        return key
@@ -0,0 +1,147 @@
+import hashlib
+import math
+import threading
+import uuid
+
+from fitter.storage import StoreStorage
+from fitter.utils.print import eprint
+
+
+class BloomFilter(object):
+    """A bloom filter of the strings
+
+    The bits are in the same order as the redis bitmap, so they can be shared through it as they are
+
+    :param capacity: The expected number of the strings
+    :param error_rate: The false positive rate at the capacity
+    """
+
+    def __init__(self, capacity, error_rate):
+        size = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.size = max(8, (size + 7) // 8 * 8)
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray(self.size // 8)
+        self.lock = threading.Lock()
+
+    def offsets(self, key):
+        digest = hashlib.md5(key.encode('utf8')).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        offsets = self.offsets(key)
+        with self.lock:
+            for offset in offsets:
+                self.bits[offset >> 3] |= 0x80 >> (offset & 7)
+        return offsets
+
+    def merge(self, bits):
+        """Merge the bits of the other bloom filter of the same size"""
+        bits = bits[:len(self.bits)].ljust(len(self.bits), b'\0')
+        with self.lock:
+            merged = int.from_bytes(self.bits, 'big') | int.from_bytes(bits, 'big')
+            self.bits[:] = merged.to_bytes(len(self.bits), 'big')
+
+    def __contains__(self, key):
+        return all(self.bits[offset >> 3] & (0x80 >> (offset & 7)) for offset in self.offsets(key))
+
+
+class IndexedStoreStorage(StoreStorage):
+    """A store storage which answers the absent images from a bloom filter of the stored keys
+
+    The filter is built by listing the store storage in background, and the absent images are checked
+    on the store storage until it is built. If the redis store is given, the filter is shared by all the nodes
+    through a redis bitmap, so the images saved by the other nodes are found too, and the bitmap is loaded
+    instead of listing the store storage once any node has built it
+
+    :param store_storage: The store storage to index
+    :param bloom_filter: The empty bloom filter
+    :param redis_store: The redis store to share the filter
+    """
+
+    INDEX_KEY_PREFIX = 'store:index:'
+
+    def __init__(self, store_storage, bloom_filter, redis_store=None):
+        self.store_storage = store_storage
+        self.bloom_filter = bloom_filter
+        self.redis = redis_store.redis if redis_store is not None else None
+        # The size and number of hashes are in the key, so the filters of the other configs are never mixed up
+        self.index_key = '{}{}:{}'.format(self.INDEX_KEY_PREFIX, bloom_filter.size, bloom_filter.hashes)
+        self.built_key = self.index_key + ':built'
+        self.ready = False
+        threading.Thread(target=self._build, daemon=True).start()
+
+    def _build(self):
+        try:
+            if self.redis is not None and self.redis.exists(self.built_key):
+                self.bloom_filter.merge(self.redis.get(self.index_key) or b'')
+                self.ready = True
+                return
+            for key in self.store_storage.list_keys():
+                self.bloom_filter.add(key)
+            if self.redis is not None:
+                # Merges into the shared bitmap, which the other nodes may be updating at the same time
+                temp_key = '{}:{}'.format(self.index_key, uuid.uuid4().hex)
+                self.redis.set(temp_key, bytes(self.bloom_filter.bits))
+                self.redis.bitop('OR', self.index_key, self.index_key, temp_key)
+                self.redis.delete(temp_key)
+                self.redis.set(self.built_key, 1)
+            self.ready = True
+        except NotImplementedError:
+            eprint('The store storage can not be listed, so the index of it is disabled')
+        except Exception as e:
+            eprint('Failed to build the index of the store storage: {}'.format(e))
+
+    def _in_shared_index(self, key):
+        pipeline = self.redis.pipeline(transaction=False)
+        for offset in self.bloom_filter.offsets(key):
+            pipeline.getbit(self.index_key, offset)
+        try:
+            return all(pipeline.execute())
+        except Exception:
+            # Can not tell it without the redis, so asks the store storage
+            return True
+
+    def exists(self, key):
+        if self.ready and key not in self.bloom_filter:
+            if self.redis is None or not self._in_shared_index(key):
+                return False
+            # Saved by the other node
+            self.bloom_filter.add(key)
+        return self.store_storage.exists(key)
+
+    def get(self, key):
+        return self.store_storage.get(key)
+
+    def get_path(self, key):
+        return self.store_storage.get_path(key)
+
+    def list_keys(self):
+        return self.store_storage.list_keys()
+
+    def is_pending(self, key):
+        return self.store_storage.is_pending(key)
+
+    def when_uploaded(self, key, callback):
+        return self.store_storage.when_uploaded(key, callback)
+
+    def flush(self):
+        return self.store_storage.flush()
+
+    def save(self, key, file):
+        saved = self.store_storage.save(key, file)
+        offsets = self.bloom_filter.add(key)
+        if self.redis is not None:
+            pipeline = self.redis.pipeline(transaction=False)
+            for offset in offsets:
+                pipeline.setbit(self.index_key, offset, 1)
+            try:
+                pipeline.execute()
+            except Exception as e:
+                # The other nodes may generate it again until they list the store storage, which is harmless
+                eprint('Failed to add {} to the shared index of the store storage: {}'.format(key, e))
+        return saved
+
+    def generate_url(self, key):
+        return self.store_storage.generate_url(key)
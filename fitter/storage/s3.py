@@ -1,9 +1,11 @@
 import os
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from fitter.storage import SourceStorage, StoreStorage
+from fitter.utils.file import get_mimetype
 
 
 class S3Storage(object):
@@ -55,11 +57,42 @@ class S3SourceStorage(S3Storage, SourceStorage):
                                           Key=os.path.join(self.location, key))
         return obj['Body']
 
+    def fetch(self, key, validator=None):
+        conditions = {'IfNoneMatch': validator} if validator is not None else {}
+        try:
+            obj = self.client.get_object(Bucket=self.bucket_name,
+                                         Key=os.path.join(self.location, key),
+                                         **conditions)
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code in ('304', 'NotModified'):
+                return None, validator
+            # S3 answers 403 for a missing key if the ListBucket is not granted, which exists treats as missing too
+            if error_code in ('404', 'NoSuchKey', '403', 'AccessDenied'):
+                return None
+            raise
+        return obj['Body'], obj['ETag']
+
 
 class S3StoreStorage(S3Storage, StoreStorage):
-    def __init__(self, *args, **kwargs):
+    """A store storage on AWS S3
+
+    The images larger than multipart_threshold bytes are uploaded in parts concurrently
+
+    :param multipart_threshold: The size of the images to be uploaded in parts, and the size of each part
+                                unless it is under the minimum part size of S3
+    :param multipart_concurrency: The number of parts uploaded at once
+    """
+
+    # S3 rejects the parts (except the last one) smaller than it
+    MIN_PART_SIZE = 5 * 1024 * 1024
+
+    def __init__(self, *args, multipart_threshold=8 * 1024 * 1024, multipart_concurrency=4, **kwargs):
         super(S3StoreStorage, self).__init__(*args, **kwargs)
         self.cache_location = os.path.join('cache', self.location.strip('/'))
+        self.transfer_config = TransferConfig(multipart_threshold=multipart_threshold,
+                                              multipart_chunksize=max(multipart_threshold, self.MIN_PART_SIZE),
+                                              max_concurrency=multipart_concurrency)
 
     def exists(self, key):
         try:
@@ -78,10 +111,19 @@ class S3StoreStorage(S3Storage, StoreStorage):
         return os.path.join(self.cache_location,
                             key)
 
+    def list_keys(self):
+        prefix = self.cache_location + '/'
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'][len(prefix):]
+
     def save(self, key, file):
-        self.client.put_object(Bucket=self.bucket_name,
-                               Key=os.path.join(self.cache_location, key),
-                               Body=file)
+        # Streams the file to S3 without buffering it once more
+        content_type = get_mimetype(key)
+        self.client.upload_fileobj(file, self.bucket_name, os.path.join(self.cache_location, key),
+                                   ExtraArgs={'ContentType': content_type},
+                                   Config=self.transfer_config)
         return key
 
     def generate_url(self, key):
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from fitter.storage import SourceStorage
+from fitter.utils.metrics import metrics
+
+_CACHED_FILE_PATTERN = re.compile(r'^(\.fitter-.*|[0-9a-f]{32})$')
+
+
+class _Entry(object):
+    __slots__ = ('path', 'validator', 'size', 'checked_at')
+
+    def __init__(self, path, validator, size, checked_at):
+        self.path = path
+        self.validator = validator
+        self.size = size
+        self.checked_at = checked_at
+
+
+class CachedSourceStorage(SourceStorage):
+    """A source storage which caches the source images of the other one on the local disk
+
+    The cached images are revalidated with their ETag (s3) or mtime (fs) in a single conditional request
+    once they are older than revalidate_after seconds, and the least recently used ones are evicted over max_bytes
+
+    :param source_storage: The source storage to cache
+    :param location: The directory to store the cached images
+    :param max_bytes: The maximum bytes of the cached images
+    :param revalidate_after: Seconds to trust the cached image without asking the source storage
+    """
+
+    def __init__(self, source_storage, location, max_bytes, revalidate_after=60):
+        self.source_storage = source_storage
+        self.location = location
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        # The index is not persisted, so the images cached by the previous process can not be validated
+        os.makedirs(self.location, exist_ok=True)
+        for name in os.listdir(self.location):
+            if _CACHED_FILE_PATTERN.match(name):
+                os.unlink(os.path.join(self.location, name))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+        os.unlink(entry.path)
+
+    def _open(self, key, entry):
+        # The opened file keeps readable even if the entry is evicted while being read
+        with self.lock:
+            if self.entries.get(key) is not entry:
+                return None
+            self.entries.move_to_end(key)
+            return open(entry.path, 'rb')
+
+    def _save(self, key, file_obj, validator):
+        fd, temp_path = tempfile.mkstemp(prefix='.fitter-', dir=self.location)
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                shutil.copyfileobj(file_obj, temp_file)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+        finally:
+            file_obj.close()
+        path = os.path.join(self.location, hashlib.md5(key.encode('utf8')).hexdigest())
+        entry = _Entry(path, validator, os.path.getsize(temp_path), time.time())
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            os.replace(temp_path, path)
+            self.entries[key] = entry
+            self.bytes += entry.size
+            saved = open(path, 'rb')
+            while self.bytes > self.max_bytes and len(self.entries) > 1:
+                self._remove(next(iter(self.entries)))
+        return saved
+
+    def exists(self, key):
+        fetched = self.fetch(key)
+        if fetched is None:
+            return False
+        fetched[0].close()
+        return True
+
+    def get(self, key):
+        fetched = self.fetch(key)
+        return fetched[0] if fetched is not None else None
+
+    def fetch(self, key, validator=None):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and time.time() - entry.checked_at < self.revalidate_after:
+            file_obj = self._open(key, entry)
+            if file_obj is not None:
+                metrics.lookup('source_cache', True)
+                return file_obj, entry.validator
+        fetched = self.source_storage.fetch(key, entry.validator if entry is not None else None)
+        if fetched is None:
+            with self.lock:
+                if key in self.entries:
+                    self._remove(key)
+            return None
+        file_obj, new_validator = fetched
+        if file_obj is None:
+            entry.checked_at = time.time()
+            file_obj = self._open(key, entry)
+            if file_obj is not None:
+                # Revalidated without downloading it
+                metrics.lookup('source_cache', True)
+                return file_obj, entry.validator
+            # Evicted in the meantime, so fetches it again without the validator
+            return self.fetch(key)
+        metrics.lookup('source_cache', False)
+        return self._save(key, file_obj, new_validator), new_validator
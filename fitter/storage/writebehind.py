@@ -0,0 +1,164 @@
+import io
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+
+from fitter.storage import StoreStorage
+from fitter.utils.print import eprint
+
+
+class UploadFailed(Exception):
+    pass
+
+
+class _Pending(object):
+    __slots__ = ('data', 'path')
+
+    def __init__(self, data=None, path=None):
+        self.data = data
+        self.path = path
+
+    def open(self):
+        if self.path is not None:
+            return open(self.path, 'rb')
+        return io.BytesIO(self.data)
+
+
+class WriteBehindStoreStorage(StoreStorage):
+    """A store storage which uploads the images to the other one on background threads
+
+    The save returns as soon as the image is held in memory (or in a temp file over max_memory_bytes),
+    and the image is served from there until its upload lands. If the backlog is full, the image is uploaded
+    in the caller like the plain store storage. What must wait for the upload, e.g. caching the url of the image,
+    is deferred with when_uploaded
+
+    :param store_storage: The store storage to upload the images to
+    :param max_backlog: The maximum number of the images waiting to be uploaded
+    :param threads: The number of the uploading threads
+    :param max_memory_bytes: The images larger than it are held in a temp file instead of memory
+    :param retries: The number of retries of a failed upload
+    :param on_failure: The function called with the key of the image failed to be uploaded
+    """
+
+    RETRY_INTERVAL = 1
+
+    def __init__(self, store_storage, max_backlog=64, threads=4, max_memory_bytes=1024 * 1024,
+                 retries=2, on_failure=None):
+        self.store_storage = store_storage
+        self.max_memory_bytes = max_memory_bytes
+        self.retries = retries
+        self.on_failure = on_failure
+        self.pending = {}
+        self.callbacks = {}
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_backlog)
+        self.uploads = queue.Queue()
+        for _ in range(threads):
+            threading.Thread(target=self._upload_forever, daemon=True).start()
+
+    def _hold(self, file):
+        data = file.read(self.max_memory_bytes + 1)
+        if len(data) <= self.max_memory_bytes:
+            return _Pending(data=data)
+        fd, path = tempfile.mkstemp(prefix='.fitter-')
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(data)
+            shutil.copyfileobj(file, temp_file)
+        return _Pending(path=path)
+
+    def _upload(self, key, pending):
+        for retry in range(self.retries + 1):
+            try:
+                with pending.open() as file:
+                    self.store_storage.save(key, file)
+                return True
+            except Exception as e:
+                eprint('Failed to upload the image {} ({}/{}): {}'.format(key, retry + 1, self.retries + 1, e))
+                time.sleep(self.RETRY_INTERVAL)
+        return False
+
+    def _upload_forever(self):
+        while True:
+            key, pending = self.uploads.get()
+            uploaded = False
+            callbacks = []
+            try:
+                uploaded = self._upload(key, pending)
+            finally:
+                with self.lock:
+                    # The callbacks of the image saved again in the meantime wait for the newer upload
+                    if self.pending.get(key) is pending:
+                        del self.pending[key]
+                        callbacks = self.callbacks.pop(key, [])
+                # The readers which opened it keep reading it
+                if pending.path is not None:
+                    os.unlink(pending.path)
+                self.slots.release()
+                for callback in callbacks:
+                    self._call(key, callback, uploaded)
+                if not uploaded and self.on_failure is not None:
+                    self._call(key, self.on_failure, key)
+                self.uploads.task_done()
+
+    @staticmethod
+    def _call(key, func, *args):
+        # A failing callback must not stop the uploading thread
+        try:
+            func(*args)
+        except Exception as e:
+            eprint('Failed to run the callback of the upload of {}: {}'.format(key, e))
+
+    def _get_pending(self, key):
+        with self.lock:
+            return self.pending.get(key)
+
+    def is_pending(self, key):
+        return self._get_pending(key) is not None
+
+    def when_uploaded(self, key, callback):
+        with self.lock:
+            if key in self.pending:
+                self.callbacks.setdefault(key, []).append(callback)
+                return
+        callback(True)
+
+    def flush(self):
+        self.uploads.join()
+
+    def exists(self, key):
+        return self.is_pending(key) or self.store_storage.exists(key)
+
+    def get(self, key):
+        pending = self._get_pending(key)
+        if pending is not None:
+            try:
+                return pending.open()
+            except FileNotFoundError:
+                # Uploaded in the meantime
+                pass
+        return self.store_storage.get(key)
+
+    def get_path(self, key):
+        return self.store_storage.get_path(key)
+
+    def list_keys(self):
+        return self.store_storage.list_keys()
+
+    def save(self, key, file):
+        if not self.slots.acquire(blocking=False):
+            return self.store_storage.save(key, file)
+        try:
+            pending = self._hold(file)
+        except Exception:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.pending[key] = pending
+        self.uploads.put((key, pending))
+        return key
+
+    def generate_url(self, key):
+        return self.store_storage.generate_url(key)
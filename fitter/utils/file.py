@@ -1,25 +1,88 @@
 import hashlib
+import json
+import mimetypes
 import os
 
+# Not known to the mimetypes of the older pythons
+mimetypes.add_type('image/webp', '.webp')
+mimetypes.add_type('image/avif', '.avif')
+
+
+# Bump it whenever the canonical variant changes, so the new keys never collide with the older ones
+HASH_VERSION = 3
+
+_CANONICAL_FORMATS = {
+    'jpeg': 'jpg',
+}
+
+# The formats each setting of the encode profiles affects. None is all of them
+_PROFILE_SETTING_FORMATS = {
+    'strip': None,
+    'progressive': ('jpg',),
+    'sampling_factor': ('jpg',),
+    'png_compression_level': ('png',),
+    'palette': ('png',),
+}
+
+
+def _canonical_op(op):
+    mode = op['mode']
+    if mode == 'thumbnail' or mode == 'resize':
+        return {'mode': mode, 'width': op['width'] or 0, 'height': op['height'] or 0}
+    if mode == 'rotate':
+        degree = float(op['degree'] or 0) % 360
+        return {'mode': mode, 'degree': degree} if degree else None
+    return dict(op)
+
+
+def _canonical_profile(profile, img_format):
+    # The disabled settings and the ones the format does not support make no difference
+    return {key: value for key, value in profile.items()
+            if value is not None and value is not False and
+            (_PROFILE_SETTING_FORMATS.get(key) is None or img_format in _PROFILE_SETTING_FORMATS[key])}
+
+
+def canonical_variant(param_set):
+    """Describe the output of the validated param set only with what affects it
+
+    The requests of the same output are described the same, regardless of the mode (e.g. resize vs a single
+    resize of 'ops'), the aliases of the format, the defaults and the params not used by the operations
+
+    :return: The JSON serializable dict of the variant
+    """
+    img_format = _CANONICAL_FORMATS.get(param_set.img_format, param_set.img_format)
+    ops = [op for op in map(_canonical_op, param_set.operations()) if op is not None]
+    variant = {
+        'path': param_set.path,
+        'format': img_format,
+        'quality': param_set.options['quality'],
+        'ops': ops,
+    }
+    # Only the resizing can be bounded by the upscale
+    if any(op['mode'] == 'resize' for op in ops):
+        variant['upscale'] = bool(param_set.options['upscale'])
+    profile = _canonical_profile(param_set.options.get('profile') or {}, img_format)
+    if profile:
+        variant['profile'] = profile
+    return variant
+
 
 def generate_hash(param_set):
-    _salt_keys = ('mode',
-                  'width',
-                  'height',
-                  'upscale',
-                  'quality',
-                  'direction',
-                  'degree')
-    hash_string = param_set.path
-    for key in _salt_keys:
-        value = param_set.__getattribute__(key)
-        if value:
-            hash_string += str(value)
+    """Generate the key of the image, which is the same for all the requests of the same output
+
+    :return: The versioned hash of the canonical variant with the extension of its format
+    """
+    variant = canonical_variant(param_set)
+    hash_string = '{}:{}'.format(HASH_VERSION, json.dumps(variant, sort_keys=True, separators=(',', ':')))
     hashed = hashlib.md5(hash_string.encode('utf8')).hexdigest()
-    hashed_with_format = '.'.join([hashed, param_set.img_format])
+    hashed_with_format = '.'.join([hashed, variant['format']])
     return hashed_with_format
 
 
+def get_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
 def get_name_with_ext(path):
     return os.path.basename(path)
 
@@ -0,0 +1,189 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_DESCRIPTIONS = {
+    'fitter_stage_duration_seconds': ('histogram', 'The latency of each stage of generating and serving the images'),
+    'fitter_stage_in_flight': ('gauge', 'The number of the stages running now'),
+    'fitter_requests_in_flight': ('gauge', 'The number of the requests being served now'),
+    'fitter_lookups_total': ('counter', 'The hits and misses of each tier looked up before generating the image'),
+    'fitter_bytes_total': ('counter', 'The bytes of the source images read (in) and the generated images (out)'),
+    'fitter_memory_cache_entries': ('gauge', 'The number of the entries of each in-memory cache'),
+    'fitter_memory_cache_bytes': ('gauge', 'The approximate bytes of the entries of each in-memory cache'),
+    'fitter_memory_cache_events_total': ('counter',
+                                         'The hits, misses, evictions and expirations of each in-memory cache'),
+}
+
+# The metric and its labels of each of the stats of the in-memory store
+_MEMORY_CACHE_STATS = {
+    'entries': ('fitter_memory_cache_entries', ()),
+    'bytes': ('fitter_memory_cache_bytes', ()),
+    'hits': ('fitter_memory_cache_events_total', (('event', 'hit'),)),
+    'misses': ('fitter_memory_cache_events_total', (('event', 'miss'),)),
+    'evictions': ('fitter_memory_cache_events_total', (('event', 'eviction'),)),
+    'expirations': ('fitter_memory_cache_events_total', (('event', 'expiration'),)),
+}
+
+# The (stage, seconds) of the current request for the Server-Timing header, None out of the requests
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _format_labels(labels):
+    return '{' + ','.join('{}="{}"'.format(name, value) for name, value in labels) + '}' if labels else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics(object):
+    """The counters, gauges and histograms of a process in the Prometheus text format
+
+    The stages timed in the worker processes of the transform executor are recorded by the executor
+
+    :param buckets: The upper bounds of the buckets of the latency histograms in seconds
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_labels = [_format_value(float(bound)) for bound in self.buckets] + ['+Inf']
+        self.lock = threading.Lock()
+        self.values = {}
+        self.histograms = {}
+        self.memory_caches = []
+
+    def _add(self, name, amount, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def inc(self, name, amount=1, **labels):
+        self._add(name, amount, labels)
+
+    def dec(self, name, amount=1, **labels):
+        self._add(name, -amount, labels)
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # The count of each bucket (and +Inf), and the sum
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += value
+
+    def record(self, stage, seconds):
+        """Record the latency of the stage, and add it to the Server-Timing of the current request"""
+        self.observe('fitter_stage_duration_seconds', seconds, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, seconds))
+
+    @contextmanager
+    def timed(self, stage):
+        """Time the stage of the with block"""
+        self.inc('fitter_stage_in_flight', stage=stage)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.dec('fitter_stage_in_flight', stage=stage)
+            self.record(stage, time.perf_counter() - started_at)
+
+    def lookup(self, tier, hit, amount=1):
+        """Count the hits or misses of the tier, e.g. the cache store or the store storage"""
+        self.inc('fitter_lookups_total', amount, tier=tier, result='hit' if hit else 'miss')
+
+    def add_bytes(self, direction, amount):
+        self.inc('fitter_bytes_total', amount, direction=direction)
+
+    def register_memory_cache(self, cache, store):
+        """Expose the stats of the in-memory store, e.g. the near cache, as the metrics labeled with the cache
+
+        They are counted by the store itself, so they are collected when rendered
+        """
+        with self.lock:
+            self.memory_caches.append((cache, store))
+
+    def _collect_memory_caches(self, memory_caches):
+        values = {}
+        for cache, store in memory_caches:
+            for stat, value in store.stats().items():
+                name, labels = _MEMORY_CACHE_STATS[stat]
+                values[(name, tuple(sorted(labels + (('cache', cache),))))] = value
+        return values
+
+    def _render_histogram(self, name, labels, histogram):
+        lines = []
+        cumulative = 0
+        for upper_bound, count in zip(self.bucket_labels, histogram):
+            cumulative += count
+            lines.append('{}_bucket{} {}'.format(
+                name, _format_labels(labels + (('le', upper_bound),)), cumulative))
+        lines.append('{}_sum{} {}'.format(name, _format_labels(labels), _format_value(histogram[-1])))
+        lines.append('{}_count{} {}'.format(name, _format_labels(labels), cumulative))
+        return lines
+
+    def render(self):
+        """Render all the metrics in the Prometheus text exposition format"""
+        with self.lock:
+            values = dict(self.values)
+            histograms = {key: list(histogram) for key, histogram in self.histograms.items()}
+            memory_caches = list(self.memory_caches)
+        # Out of the lock, as the stores take their own locks
+        values.update(self._collect_memory_caches(memory_caches))
+        lines = []
+        for name in sorted(_DESCRIPTIONS):
+            metric_type, description = _DESCRIPTIONS[name]
+            lines.append('# HELP {} {}'.format(name, description))
+            lines.append('# TYPE {} {}'.format(name, metric_type))
+            if metric_type == 'histogram':
+                for (metric_name, labels), histogram in sorted(histograms.items()):
+                    if metric_name == name:
+                        lines.extend(self._render_histogram(name, labels, histogram))
+            else:
+                for (metric_name, labels), value in sorted(values.items()):
+                    if metric_name == name:
+                        lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def start_timings():
+    """Start collecting the timings of the stages in the current context, e.g. a request
+
+    :return: The token to pass to stop_timings
+    """
+    return _request_timings.set([])
+
+
+def stop_timings(token):
+    """Stop collecting the timings started by start_timings
+
+    :return: The list of (stage, seconds) in the order they are done
+    """
+    timings = _request_timings.get()
+    _request_timings.reset(token)
+    return timings or []
+
+
+def current_timings():
+    """The timings of the current context so far, None if they are not being collected"""
+    return _request_timings.get()
+
+
+def server_timing(timings):
+    """Format the timings as the value of the Server-Timing header, summing up the same stages"""
+    durations = {}
+    for stage, seconds in timings:
+        durations[stage] = durations.get(stage, 0) + seconds
+    return ', '.join('{};dur={:.1f}'.format(stage, seconds * 1000) for stage, seconds in durations.items())
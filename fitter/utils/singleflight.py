@@ -0,0 +1,47 @@
+import threading
+
+
+class SingleFlightTimeout(Exception):
+    pass
+
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Coalesces the concurrent calls for the same key into a single execution
+
+    The first caller of a key runs the function and the others wait for its result
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, timeout=None, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self.calls[key] = call
+        if not is_leader:
+            if not call.done.wait(timeout):
+                raise SingleFlightTimeout('Timed out waiting for \'{}\''.format(key))
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
@@ -1,61 +1,87 @@
 from flask import jsonify
-from flask import redirect
 
 from fitter import fitter
-from fitter.cachestore.decorators import cache
 from fitter.cachestore.decorators import from_cache_store
-from fitter.engine.image import transform
+from fitter.cachestore.decorators import from_negative_cache
+from fitter.jobqueue import JobQueue
 from fitter.storage.decorators import from_store_storage
+from fitter.views.errors import error_response
+from fitter.views.errors import job_not_found
+from fitter.views.pipeline import generate_batch_or_error
+from fitter.views.pipeline import generate_or_error
+from fitter.views.stream import get_image
+from fitter.views.stream import redirect_to_image
+from fitter.views.stream import stream_image
 
 
 @from_cache_store('show')
+@from_negative_cache()
 @from_store_storage('show')
-@cache()
 def show_view(hashed, param_set):
-    # TODO: Run it on async background. Supports async job
-    if fitter.source_storage.exists(param_set.path):
-        original_image = fitter.source_storage.get(param_set.path)
-        transformed_image = transform(param_set.mode, original_image, param_set)
-        fitter.store_storage.save(hashed, transformed_image)
-
-        return jsonify(
-            url=fitter.store_storage.generate_url(hashed),
-        )
+    # The url is deterministic, so returns it without waiting for the image to be generated
+    # It is cached by the job worker once the image is generated
+    fitter.job_queue.put(hashed, param_set)
     return jsonify(
-        errors='The filepath {} is not found on your source storage'.format(param_set.path)
+        url=fitter.store_storage.generate_url(hashed),
+        job='/jobs/{}'.format(hashed),
     )
 
 
+def batch_view(param_sets):
+    filenames, error = generate_batch_or_error(param_sets)
+    if error is not None:
+        return error_response(error)
+    return jsonify(
+        images=[{
+            'filename': filename,
+            'path': fitter.store_storage.get_path(filename),
+            'url': fitter.store_storage.generate_url(filename),
+        } for filename in filenames],
+    )
+
+
+def job_status_view(hashed):
+    status = fitter.job_queue.get_status(hashed)
+    if status is None:
+        # The status is expired, or the image is generated by the other actions
+        if not fitter.store_storage.exists(key=hashed):
+            return error_response(job_not_found(hashed))
+        # Done once its url is found on the store storage
+        status = {'status': JobQueue.RUNNING if fitter.store_storage.is_pending(hashed) else JobQueue.DONE}
+    response = {'hash': hashed, 'status': status['status']}
+    if status['status'] == JobQueue.DONE:
+        response['url'] = fitter.store_storage.generate_url(hashed)
+    if status.get('error'):
+        response['error'] = status['error']
+    return jsonify(**response)
+
+
 @from_cache_store('get')
+@from_negative_cache()
 @from_store_storage('get')
-@cache()
 def get_view(hashed, param_set):
-    if fitter.source_storage.exists(param_set.path):
-        original_image = fitter.source_storage.get(param_set.path)
-        transformed_image = transform(param_set.mode, original_image, param_set)
-        fitter.store_storage.save(hashed, transformed_image)
-
-        return jsonify(
-            filename=hashed,
-            path=fitter.store_storage.get_path(hashed),
-            url=fitter.store_storage.generate_url(hashed),
-        )
-    return jsonify(
-        errors='The filepath {} is not found on your source storage'.format(param_set.path)
-    )
+    error = generate_or_error(hashed, param_set)
+    if error is not None:
+        return error_response(error)
+    return get_image(hashed)
 
 
 @from_cache_store('redirect')
+@from_negative_cache()
 @from_store_storage('redirect')
-@cache()
 def redirect_view(hashed, param_set):
-    if fitter.source_storage.exists(param_set.path):
-        original_image = fitter.source_storage.get(param_set.path)
-        transformed_image = transform(param_set.mode, original_image, param_set)
-        fitter.store_storage.save(hashed, transformed_image)
+    error = generate_or_error(hashed, param_set)
+    if error is not None:
+        return error_response(error)
+    # Add header for image format
+    return redirect_to_image(hashed)
 
-        # Add header for image format
-        return redirect(fitter.store_storage.generate_url(hashed), code=302)
-    return jsonify(
-        errors='The filepath {} is not found on your source storage'.format(param_set.path)
-    )
+
+@from_cache_store('image')
+@from_negative_cache()
+@from_store_storage('image')
+def image_view(hashed, param_set):
+    error = generate_or_error(hashed, param_set)
+    if error is not None:
+        return error_response(error)
+    return stream_image(hashed)
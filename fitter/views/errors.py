@@ -0,0 +1,46 @@
+from flask import jsonify
+
+# Each error is the (status, message), which the flask and async views respond in their own way
+
+
+def invalid_params(errors):
+    # Responded with 200 as it always has been, same as the missing source image
+    return 200, errors
+
+
+def source_not_found(path):
+    # Responded with 200 as it always has been, the clients tell it by the 'errors'
+    return 200, 'The filepath {} is not found on your source storage'.format(path)
+
+
+def source_too_large(path, reason):
+    return 413, 'The image {} is too large to be generated: {}'.format(path, reason)
+
+
+def generation_timed_out(path):
+    return 504, 'Timed out waiting for the image {} to be generated'.format(path)
+
+
+def transform_executor_busy():
+    return 503, 'Too many images are being generated, try again later'
+
+
+def transform_failed(path, reason):
+    return 500, 'Failed to transform the image {}: {}'.format(path, reason)
+
+
+def upload_failed(path, reason):
+    return 502, 'Failed to upload the image {} to your store storage: {}'.format(path, reason)
+
+
+def job_not_found(hashed):
+    return 404, 'The job of the image {} is not found'.format(hashed)
+
+
+def error_response(error):
+    status, message = error
+    response = jsonify(errors=message)
+    response.status_code = status
+    # Never cached along with the images, as the error may be gone soon, e.g. the source image is uploaded
+    response.headers['Cache-Control'] = 'no-store'
+    return response
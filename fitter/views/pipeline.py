@@ -0,0 +1,388 @@
+"""The steps of looking up and generating the images, shared by the flask views and the async ones
+
+Every function here is blocking, so the async views run them on their executors or do the same steps
+through the async cache store and storages
+"""
+import io
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from fitter import fitter
+from fitter.cachestore.lease import LeaseTimeout
+from fitter.engine.executor import ExecutorBusy
+from fitter.engine.executor import TransformError
+from fitter.engine.executor import TransformTimeout
+from fitter.engine.image import transform
+from fitter.engine.image import transform_many
+from fitter.engine.probe import ImageTooLarge
+from fitter.engine.probe import read_limited
+from fitter.jobqueue import JobQueue
+from fitter.storage.index import IndexedStoreStorage
+from fitter.storage.writebehind import UploadFailed
+from fitter.utils.file import canonical_variant
+from fitter.utils.file import generate_hash
+from fitter.utils.metrics import metrics
+from fitter.utils.singleflight import SingleFlightTimeout
+from fitter.views.errors import generation_timed_out
+from fitter.views.errors import source_not_found
+from fitter.views.errors import source_too_large
+from fitter.views.errors import transform_executor_busy
+from fitter.views.errors import transform_failed
+from fitter.views.errors import upload_failed
+
+GENERATION_TIMEOUTS = (SingleFlightTimeout, LeaseTimeout, TransformTimeout)
+
+
+def find_cached(hashed):
+    """Look up the filename of the image on the cache store
+
+    :return: The filename, None if it is not cached
+    """
+    if fitter.cache_store is None:
+        return None
+    with metrics.timed('cache_lookup'):
+        cached = fitter.cache_store.get(hashed)
+    metrics.lookup('cache_store', cached is not None)
+    return cached_filename(cached)
+
+
+def cached_filename(cached):
+    """The filename of the entry on the cache store
+
+    :return: The filename, None if it is not cached
+    """
+    if cached is None:
+        return None
+    # Only the filename is cached, the path and url are recomputed from it.
+    # The entries cached by older versions hold all of them as a dict
+    return cached['filename'] if isinstance(cached, dict) else cached
+
+
+def is_missing(path):
+    """Whether if the path is recently not found on the source storage"""
+    if fitter.negative_cache is None:
+        return False
+    missing = fitter.negative_cache.is_missing(path)
+    metrics.lookup('negative_cache', missing)
+    return missing
+
+
+def add_missing(path):
+    """Remember the path not found on the source storage, so it is not fetched again for a while"""
+    if fitter.negative_cache is not None:
+        fitter.negative_cache.add(path)
+
+
+def is_stored(hashed):
+    with metrics.timed('store_exists'):
+        exists = fitter.store_storage.exists(key=hashed)
+    metrics.lookup('store_storage', exists)
+    return exists
+
+
+def remember(hashed):
+    """Cache the filename of the generated image once it is uploaded to the store storage
+
+    The other nodes must not find it on the cache store before they can find it on the store storage
+    """
+    if fitter.cache_store is None:
+        return
+
+    def cache_uploaded(uploaded):
+        if uploaded:
+            fitter.cache_store.set(hashed, hashed)
+
+    fitter.store_storage.when_uploaded(hashed, cache_uploaded)
+
+
+def _preserves_aspect_ratio(param_set):
+    # The thumbnail is a crop of the image, so it is neither derived nor derived from
+    return param_set.mode == 'resize' and not (param_set.width and param_set.height)
+
+
+def can_derive_from(param_set):
+    # The palette of the quantized image has too few colors to derive the others from it
+    return _preserves_aspect_ratio(param_set) and not param_set.options.get('profile', {}).get('palette')
+
+
+def fetch_derivable_variant(param_set):
+    """Fetch the larger variant of the same image to derive the image from, on the store storage
+
+    :return: The file-like object of the variant, None if there is no such variant
+    """
+    if fitter.variant_index is None or param_set.mode != 'resize':
+        return None
+    variant = canonical_variant(param_set)
+    filename = fitter.variant_index.find(param_set.path, param_set.width, param_set.height,
+                                         variant['format'], variant['quality'], variant.get('profile', {}),
+                                         fitter.config['OPTIONS']['DERIVE_MIN_SCALE'])
+    metrics.lookup('variant_index', filename is not None)
+    if filename is None:
+        return None
+    try:
+        return fitter.store_storage.get(filename)
+    except Exception:
+        # Falls back to the source image if the variant is gone
+        return None
+
+
+def _index_variant(hashed, param_set, size):
+    variant = canonical_variant(param_set)
+    fitter.variant_index.add(param_set.path, hashed, size, variant['format'], variant['quality'],
+                             variant.get('profile', {}))
+
+
+def byte_size(image_obj):
+    # Not getbuffer, which copies the bytes shared by the BytesIO
+    size = image_obj.seek(0, io.SEEK_END)
+    image_obj.seek(0)
+    return size
+
+
+def read_source(source_image):
+    """Read the source image within the limits of the options
+
+    Raises ImageTooLarge before decoding it if it is over the limits
+    """
+    try:
+        with metrics.timed('source_read'):
+            image = read_limited(source_image,
+                                 max_bytes=fitter.config['OPTIONS']['MAX_SOURCE_BYTES'],
+                                 max_pixels=fitter.config['OPTIONS']['MAX_SOURCE_PIXELS'])
+    finally:
+        source_image.close()
+    metrics.add_bytes('in', byte_size(image))
+    return image
+
+
+def _fetch_source(path):
+    with metrics.timed('source_fetch'):
+        return fitter.source_storage.fetch(path)
+
+
+def _save(hashed, transformed_image):
+    metrics.add_bytes('out', byte_size(transformed_image))
+    with metrics.timed('upload'):
+        return fitter.store_storage.save(hashed, transformed_image)
+
+
+def transform_image(mode, image_obj, param_set):
+    """Transform the image, on the transform executor if enabled
+
+    :return: (The transformed image, its (width, height))
+    """
+    if fitter.transform_executor is not None:
+        return fitter.transform_executor.transform(mode, image_obj, param_set)
+    return transform(mode, image_obj, param_set)
+
+
+def _transform_many(image_obj, param_sets):
+    if fitter.transform_executor is not None:
+        return fitter.transform_executor.transform_many(image_obj, param_sets)
+    return transform_many(image_obj, param_sets)
+
+
+def store(hashed, param_set, transformed_image, size):
+    """Save the generated image to the store storage, and index it to derive the others from if it can be"""
+    _save(hashed, transformed_image)
+    if fitter.variant_index is not None and can_derive_from(param_set):
+        _index_variant(hashed, param_set, size)
+
+
+def _generate(hashed, param_set):
+    # Derives the image from a larger variant if exists, which is much smaller than the source image
+    source_image = fetch_derivable_variant(param_set)
+    if source_image is None:
+        fetched = _fetch_source(param_set.path)
+        if fetched is None:
+            add_missing(param_set.path)
+            return False
+        source_image = fetched[0]
+    original_image = read_source(source_image)
+    transformed_image, size = transform_image(param_set.mode, original_image, param_set)
+    store(hashed, param_set, transformed_image, size)
+    return True
+
+
+def is_uploaded(hashed):
+    """Whether if the image is on the store storage, e.g. generated by the other node holding the lease"""
+    # Asks the store storage behind the index, which may not know the image saved by the other node yet
+    store_storage = fitter.store_storage
+    if isinstance(store_storage, IndexedStoreStorage):
+        store_storage = store_storage.store_storage
+    return store_storage.exists(key=hashed)
+
+
+def _generate_with_lease(hashed, param_set):
+    if fitter.generation_lease is None:
+        return _generate(hashed, param_set)
+    # Only the node holding the lease generates it, the others wait for it on the store storage.
+    # The lease is held until the image is uploaded, so the others do not generate it again in the meantime
+    return fitter.generation_lease.run(
+        hashed,
+        lambda: _generate(hashed, param_set),
+        lambda: is_uploaded(hashed),
+        timeout=fitter.config['OPTIONS']['GENERATE_TIMEOUT'],
+        release_later=lambda release: release_when_uploaded(hashed, release),
+    )
+
+
+def release_when_uploaded(hashed, release):
+    """Release the generation lease once the image is uploaded (or failed to be)"""
+    fitter.store_storage.when_uploaded(hashed, lambda uploaded: release())
+
+
+def wait_until_uploaded(hashes, timeout):
+    """Wait until the images are uploaded, as the write behind store storage uploads them later
+    and their urls on the store storage are not found until then
+
+    Raises UploadFailed if any of them failed to be uploaded, or is not uploaded in the timeout
+    """
+    results = []
+    for hashed in hashes:
+        result = Future()
+        fitter.store_storage.when_uploaded(hashed, result.set_result)
+        results.append((hashed, result))
+    deadline = time.time() + timeout
+    for hashed, result in results:
+        try:
+            uploaded = result.result(max(deadline - time.time(), 0))
+        except FutureTimeout:
+            raise UploadFailed('The image {} is not uploaded in {} seconds'.format(hashed, timeout))
+        if not uploaded:
+            raise UploadFailed('The image {} failed to be uploaded'.format(hashed))
+
+
+def generate(hashed, param_set):
+    """Generate the image and save it to the store storage
+
+    The concurrent requests for the same variant share a single generation,
+    and across the nodes too if the generation lease is enabled
+
+    :return: True if the image is generated, False if the source image does not exist
+    """
+    return fitter.single_flight.do(hashed, _generate_with_lease, hashed, param_set,
+                                   timeout=fitter.config['OPTIONS']['GENERATE_TIMEOUT'])
+
+
+def _generate_batch(hashes, param_sets):
+    fetched = _fetch_source(param_sets[0].path)
+    if fetched is None:
+        add_missing(param_sets[0].path)
+        return False
+    original_image = read_source(fetched[0])
+    transformed = _transform_many(original_image, param_sets)
+    saving = [fitter.upload_executor.submit(_save, hashed, transformed_image)
+              for hashed, (transformed_image, _) in zip(hashes, transformed)]
+    for future in saving:
+        future.result()
+    if fitter.variant_index is not None:
+        for hashed, param_set, (_, size) in zip(hashes, param_sets, transformed):
+            if can_derive_from(param_set):
+                _index_variant(hashed, param_set, size)
+    return True
+
+
+def generate_batch(param_sets, check_existing=True):
+    """Generate the variants of an image which do not exist yet, fetching and decoding the source image only once
+
+    The variants are uploaded to the store storage concurrently, and the same concurrent batches share
+    a single generation
+
+    :param param_sets: The param sets of the variants of the same path
+    :param check_existing: Whether if skip the variants on the cache store or the store storage.
+                           False if the caller already knows that none of them exist
+    :return: The filenames of the variants in the same order, None if the source image does not exist
+    """
+    hashes = [generate_hash(param_set) for param_set in param_sets]
+    variants = OrderedDict(zip(hashes, param_sets))
+    if fitter.cache_store is not None and check_existing:
+        cached = fitter.cache_store.get_many(list(variants))
+    else:
+        cached = [None] * len(variants)
+    missing = [hashed for hashed, value in zip(variants, cached)
+               if value is None and not (check_existing and fitter.store_storage.exists(key=hashed))]
+    if missing:
+        generated = fitter.single_flight.do(
+            'batch:' + ','.join(missing),
+            _generate_batch, missing, [variants[hashed] for hashed in missing],
+            timeout=fitter.config['OPTIONS']['GENERATE_TIMEOUT'],
+        )
+        if not generated:
+            return None
+    if fitter.cache_store is not None:
+        fitter.cache_store.set_many({hashed: hashed for hashed, value in zip(variants, cached)
+                                     if value is None and hashed not in missing})
+        for hashed in missing:
+            remember(hashed)
+    return hashes
+
+
+def error_of(e, path):
+    """The (status, message) of the error raised by the generation
+
+    Raises the error again if it is not the one of the generation
+    """
+    if isinstance(e, ImageTooLarge):
+        return source_too_large(path, e)
+    if isinstance(e, GENERATION_TIMEOUTS):
+        return generation_timed_out(path)
+    if isinstance(e, ExecutorBusy):
+        return transform_executor_busy()
+    if isinstance(e, TransformError):
+        return transform_failed(path, e)
+    if isinstance(e, UploadFailed):
+        return upload_failed(path, e)
+    raise e
+
+
+def generate_or_error(hashed, param_set):
+    """Generate the image and cache it, but never the errors like a missing source image
+
+    :return: None if the image is generated, the (status, message) of the error otherwise
+    """
+    try:
+        generated = generate(hashed, param_set)
+    except Exception as e:
+        return error_of(e, param_set.path)
+    if not generated:
+        return source_not_found(param_set.path)
+    remember(hashed)
+    return None
+
+
+def generate_batch_or_error(param_sets):
+    """Generate the variants of an image unless its source image is known to be missing
+
+    The variants are responded with their urls, so it waits until they are uploaded
+
+    :return: (filenames, None) if the variants are generated, (None, the (status, message) of the error) otherwise
+    """
+    path = param_sets[0].path
+    if is_missing(path):
+        return None, source_not_found(path)
+    try:
+        filenames = generate_batch(param_sets)
+        if filenames is not None:
+            wait_until_uploaded(filenames, fitter.config['OPTIONS']['GENERATE_TIMEOUT'])
+    except Exception as e:
+        return None, error_of(e, path)
+    if filenames is None:
+        return None, source_not_found(path)
+    return filenames, None
+
+
+def run_job(hashed, param_set):
+    """Generate the image queued by the show action and cache it
+
+    The job is done once the image is uploaded, as its url is responded by the status of the job
+
+    :return: The status of the job
+    """
+    if not generate(hashed, param_set):
+        return JobQueue.NOT_FOUND
+    remember(hashed)
+    wait_until_uploaded([hashed], fitter.config['OPTIONS']['GENERATE_TIMEOUT'])
+    return JobQueue.DONE
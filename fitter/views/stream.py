@@ -0,0 +1,67 @@
+from flask import jsonify
+from flask import redirect
+from flask import request
+from flask import Response
+from flask import url_for
+
+from fitter import fitter
+from fitter.utils.file import get_mimetype
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _read_chunks(image):
+    try:
+        for chunk in iter(lambda: image.read(STREAM_CHUNK_SIZE), b''):
+            yield chunk
+    finally:
+        image.close()
+
+
+def _url_of(filename):
+    """The url of the image on the store storage, or of the image action while it is being uploaded,
+    as the url on the store storage is not found until then
+
+    :return: (The url, whether if the image is being uploaded)
+    """
+    if fitter.store_storage.is_pending(filename):
+        return url_for('generate_and_stream', _external=True, **request.args.to_dict()), True
+    return fitter.store_storage.generate_url(filename), False
+
+
+def _image_info(pending, **fields):
+    response = jsonify(**fields)
+    if pending:
+        # Responds the url on the store storage once uploaded
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def show_image(filename):
+    """Respond the url of the image"""
+    url, pending = _url_of(filename)
+    return _image_info(pending, url=url)
+
+
+def get_image(filename):
+    """Respond the filename, path and url of the image"""
+    url, pending = _url_of(filename)
+    return _image_info(pending, filename=filename, path=fitter.store_storage.get_path(filename), url=url)
+
+
+def redirect_to_image(filename):
+    """Redirect to the image on the store storage, or to the image action while it is being uploaded"""
+    if fitter.store_storage.is_pending(filename):
+        response = redirect(url_for('generate_and_stream', **request.args.to_dict()), code=302)
+        # Redirects to the store storage once uploaded
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    return redirect(fitter.store_storage.generate_url(filename), code=302)
+
+
+def stream_image(filename):
+    """Stream the generated image on the store storage with the filename (hash) as a strong ETag"""
+    image = fitter.store_storage.get(filename)
+    response = Response(_read_chunks(image), mimetype=get_mimetype(filename))
+    response.set_etag(filename)
+    return response
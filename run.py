@@ -1,7 +1,9 @@
-from fitter import fitter
+from fitter.components import create_app
 from fitter.server.api import upload
 
 if __name__ == '__main__':
+    # Only in the main process, as the spawned transform workers import this module again
+    fitter = create_app()
     if fitter.config['OPTIONS']['ENABLE_UPLOAD']:
         fitter.add_url_rule('/upload', view_func=upload, methods=['POST'])
     fitter.run('0.0.0.0', port=fitter.config['PORT'])
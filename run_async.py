@@ -0,0 +1,15 @@
+import sys
+
+from fitter.utils.print import eprint
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        eprint('You need \'uvicorn\' to run fitter on asyncio: pip install uvicorn')
+        sys.exit(-1)
+    # The app is set up by importing it, only in the main process as the spawned transform workers
+    # import this module again
+    from fitter import fitter
+    from fitter.aio.app import app
+    uvicorn.run(app, host='0.0.0.0', port=fitter.config['PORT'])
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+# The config of the app is loaded from the fitter.yaml of the working directory on import,
+# so the tests run in a temp directory with the minimal one
+_CONFIG = '''storage:
+  source:
+    type: fs
+    location: {0}/source
+    base_url: http://localhost:6001
+  store:
+    type: fs
+    location: {0}/store
+    base_url: http://localhost:6001
+'''
+
+_work_dir = tempfile.mkdtemp()
+with open(os.path.join(_work_dir, 'fitter.yaml'), 'w') as config_file:
+    config_file.write(_CONFIG.format(_work_dir))
+os.chdir(_work_dir)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,78 @@
+import pytest
+
+from fitter.server.paramset import ParamSet
+from fitter.utils.file import generate_hash
+
+
+def _hash(**args):
+    param_set = ParamSet.from_args(dict(args, path='products/1.jpg'))
+    assert param_set.validate(), param_set.errors
+    return generate_hash(param_set)
+
+
+@pytest.fixture
+def encode_profiles():
+    profiles, default_profile = ParamSet.ENCODE_PROFILES, ParamSet.DEFAULT_ENCODE_PROFILE
+    ParamSet.set_encode_profiles({'none': {}, 'progressive': {'progressive': True}}, 'none')
+    yield
+    ParamSet.set_encode_profiles(profiles, default_profile)
+
+
+@pytest.fixture
+def presets():
+    ParamSet.set_presets({'card': {'mode': 'resize', 'width': 300, 'height': 0, 'format': 'jpg', 'quality': 80}})
+    yield
+    ParamSet.set_presets({})
+
+
+def test_format_aliases_share_the_hash():
+    assert _hash(mode='resize', width='300', height='0', format='jpeg') == \
+        _hash(mode='resize', width='300', height='0', format='jpg')
+
+
+def test_hash_has_the_extension_of_the_canonical_format():
+    assert _hash(mode='resize', width='300', height='0', format='jpeg').endswith('.jpg')
+
+
+def test_single_op_chain_shares_the_hash_of_the_mode():
+    assert _hash(ops='resize:300x0', format='png') == _hash(mode='resize', width='300', height='0', format='png')
+
+
+def test_omitted_size_shares_the_hash_of_zero():
+    assert _hash(mode='resize', width='300', format='png') == \
+        _hash(mode='resize', width='300', height='0', format='png')
+
+
+def test_unused_params_do_not_change_the_hash():
+    assert _hash(mode='resize', width='300', height='0', direction='h', degree='90') == \
+        _hash(mode='resize', width='300', height='0')
+
+
+def test_upscale_only_matters_to_resizing():
+    assert _hash(mode='flip', direction='h', upscale='false') == _hash(mode='flip', direction='h', upscale='true')
+    assert _hash(mode='resize', width='300', height='0', upscale='false') != \
+        _hash(mode='resize', width='300', height='0', upscale='true')
+
+
+def test_zero_rotation_is_dropped():
+    assert _hash(ops='rotate:0|resize:300x0') == _hash(ops='rotate:360|resize:300x0') == \
+        _hash(mode='resize', width='300', height='0')
+    assert _hash(ops='rotate:90|resize:300x0') != _hash(mode='resize', width='300', height='0')
+
+
+def test_different_outputs_do_not_share_the_hash():
+    base = _hash(mode='resize', width='300', height='0', format='jpg', quality='80')
+    assert base != _hash(mode='resize', width='301', height='0', format='jpg', quality='80')
+    assert base != _hash(mode='thumbnail', width='300', height='0', format='jpg', quality='80')
+    assert base != _hash(mode='resize', width='300', height='0', format='jpg', quality='81')
+
+
+def test_profile_settings_only_matter_to_their_formats(encode_profiles):
+    assert _hash(mode='resize', width='300', height='0', format='png', profile='progressive') == \
+        _hash(mode='resize', width='300', height='0', format='png', profile='none')
+    assert _hash(mode='resize', width='300', height='0', format='jpg', profile='progressive') != \
+        _hash(mode='resize', width='300', height='0', format='jpg', profile='none')
+
+
+def test_preset_shares_the_hash_of_its_params(presets):
+    assert _hash(preset='card') == _hash(mode='resize', width='300', height='0', format='jpg', quality='80')
@@ -0,0 +1,133 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from fitter.cachestore.lease import GenerationLease
+from fitter.cachestore.lease import LeaseTimeout
+
+
+class _LeaseStore(object):
+    """The leases of the redis store, expiring in memory"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.leases = {}
+        self.renewals = 0
+
+    def _get(self, key):
+        lease = self.leases.get(key)
+        if lease is not None and lease[1] <= time.time():
+            del self.leases[key]
+            return None
+        return lease
+
+    def acquire_lease(self, key, ttl):
+        with self.lock:
+            if self._get(key) is not None:
+                return None
+            token = uuid.uuid4().hex
+            self.leases[key] = (token, time.time() + ttl)
+            return token
+
+    def release_lease(self, key, token):
+        with self.lock:
+            if self._get(key) is not None and self.leases[key][0] == token:
+                del self.leases[key]
+
+    def renew_lease(self, key, token, ttl):
+        with self.lock:
+            self.renewals += 1
+            lease = self._get(key)
+            if lease is None or lease[0] != token:
+                return False
+            self.leases[key] = (token, time.time() + ttl)
+            return True
+
+    def has_lease(self, key):
+        with self.lock:
+            return self._get(key) is not None
+
+
+@pytest.fixture
+def store():
+    return _LeaseStore()
+
+
+def test_runs_and_releases_the_free_lease(store):
+    lease = GenerationLease(store, ttl=5, poll_interval=0.01)
+    assert lease.run('key', lambda: 'generated', lambda: False) == 'generated'
+    assert not lease.is_held('key')
+
+
+def test_releases_the_lease_if_failed(store):
+    lease = GenerationLease(store, ttl=5, poll_interval=0.01)
+    with pytest.raises(ValueError):
+        lease.run('key', _raise, lambda: False)
+    assert not lease.is_held('key')
+
+
+def test_holds_the_lease_until_released_later(store):
+    lease = GenerationLease(store, ttl=5, poll_interval=0.01)
+    releases = []
+    assert lease.run('key', lambda: 'generated', lambda: False, release_later=releases.append) == 'generated'
+    assert lease.is_held('key')
+    releases[0]()
+    assert not lease.is_held('key')
+
+
+def test_renews_the_lease_longer_than_the_ttl(store):
+    lease = GenerationLease(store, ttl=0.3, poll_interval=0.01)
+
+    def generate():
+        time.sleep(0.8)
+        return lease.is_held('key')
+
+    assert lease.run('key', generate, lambda: False) is True
+    assert store.renewals >= 2
+    assert not lease.is_held('key')
+
+
+def test_stops_renewing_the_lease_taken_over(store):
+    lease = GenerationLease(store, ttl=0.3, poll_interval=0.01)
+    release = lease.acquire('key')
+    with store.lock:
+        store.leases['key'] = ('other', time.time() + 5)
+    time.sleep(0.5)
+    renewals = store.renewals
+    time.sleep(0.3)
+    assert store.renewals == renewals
+    release()
+    # Never releases the lease of the other node
+    assert lease.is_held('key')
+
+
+def test_waits_for_the_other_node_holding_the_lease(store):
+    lease = GenerationLease(store, ttl=5, poll_interval=0.01)
+    release = lease.acquire('key')
+    done = threading.Event()
+    threading.Timer(0.1, done.set).start()
+    calls = []
+    assert lease.run('key', lambda: calls.append(1), done.is_set) is True
+    assert calls == []
+    release()
+
+
+def test_takes_over_the_lease_released_without_the_result(store):
+    lease = GenerationLease(store, ttl=5, poll_interval=0.01)
+    release = lease.acquire('key')
+    threading.Timer(0.1, release).start()
+    assert lease.run('key', lambda: 'generated', lambda: False) == 'generated'
+
+
+def test_times_out_waiting_for_the_other_node(store):
+    lease = GenerationLease(store, ttl=5, poll_interval=0.01)
+    release = lease.acquire('key')
+    with pytest.raises(LeaseTimeout):
+        lease.run('key', lambda: 'generated', lambda: False, timeout=0.1)
+    release()
+
+
+def _raise():
+    raise ValueError('broken')
@@ -0,0 +1,35 @@
+import time
+
+from fitter.cachestore.negative import InMemoryNegativeCache
+from fitter.cachestore.negative import RedisNegativeCache
+
+
+def test_remembers_the_missing_path():
+    negative_cache = InMemoryNegativeCache(max_entries=10, ttl=60)
+    assert not negative_cache.is_missing('products/1.jpg')
+    negative_cache.add('products/1.jpg')
+    assert negative_cache.is_missing('products/1.jpg')
+    assert not negative_cache.is_missing('products/2.jpg')
+
+
+def test_forgets_the_missing_path_after_the_ttl(monkeypatch):
+    negative_cache = InMemoryNegativeCache(max_entries=10, ttl=60)
+    negative_cache.add('products/1.jpg')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert not negative_cache.is_missing('products/1.jpg')
+
+
+def test_forgets_the_least_recently_missing_paths_over_max_entries():
+    negative_cache = InMemoryNegativeCache(max_entries=2, ttl=60)
+    negative_cache.add('products/1.jpg')
+    negative_cache.add('products/2.jpg')
+    negative_cache.add('products/3.jpg')
+    assert not negative_cache.is_missing('products/1.jpg')
+    assert negative_cache.is_missing('products/2.jpg')
+    assert negative_cache.is_missing('products/3.jpg')
+
+
+def test_redis_key_is_prefixed():
+    # Never collides with the hashes of the images on the same redis
+    assert RedisNegativeCache.KEY.startswith('negative:')
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+from fitter.utils.singleflight import SingleFlight
+from fitter.utils.singleflight import SingleFlightTimeout
+
+
+def _run_concurrently(count, target):
+    results = [None] * count
+    errors = [None] * count
+
+    def run(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            errors[index] = e
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_a_single_execution():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    finish = threading.Event()
+    calls = []
+
+    def generate():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return 'generated'
+
+    leader, results, _ = _run_concurrently(1, lambda: single_flight.do('key', generate))
+    assert started.wait(5)
+    followers, follower_results, _ = _run_concurrently(4, lambda: single_flight.do('key', generate))
+    finish.set()
+    for thread in leader + followers:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results + follower_results == ['generated'] * 5
+
+
+def test_the_error_is_shared_with_the_waiters():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    finish = threading.Event()
+
+    def fail():
+        started.set()
+        finish.wait(5)
+        raise ValueError('broken')
+
+    leader, _, leader_errors = _run_concurrently(1, lambda: single_flight.do('key', fail))
+    assert started.wait(5)
+    followers, _, follower_errors = _run_concurrently(2, lambda: single_flight.do('key', fail))
+    finish.set()
+    for thread in leader + followers:
+        thread.join(5)
+    assert all(isinstance(error, ValueError) for error in leader_errors + follower_errors)
+
+
+def test_waiter_times_out_without_cancelling_the_call():
+    single_flight = SingleFlight()
+    started = threading.Event()
+    finish = threading.Event()
+
+    def generate():
+        started.set()
+        finish.wait(5)
+        return 'generated'
+
+    leader, results, _ = _run_concurrently(1, lambda: single_flight.do('key', generate))
+    assert started.wait(5)
+    with pytest.raises(SingleFlightTimeout):
+        single_flight.do('key', generate, timeout=0.01)
+    finish.set()
+    leader[0].join(5)
+    assert results == ['generated']
+
+
+def test_the_key_is_released_after_the_call():
+    single_flight = SingleFlight()
+    calls = []
+    single_flight.do('key', calls.append, 1)
+    single_flight.do('key', calls.append, 2)
+    assert calls == [1, 2]
+    assert single_flight.calls == {}
+
+
+def test_different_keys_run_separately():
+    single_flight = SingleFlight()
+    assert single_flight.do('a', lambda: 'a') == 'a'
+    assert single_flight.do('b', lambda: 'b') == 'b'
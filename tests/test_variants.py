@@ -0,0 +1,70 @@
+import pytest
+
+from fitter.cachestore.inmemory import InMemoryStore
+from fitter.cachestore.variants import VariantIndex
+
+_PATH = 'products/1.jpg'
+
+
+@pytest.fixture
+def index():
+    return VariantIndex(InMemoryStore())
+
+
+def _find(index, width=100, height=0, img_format='jpg', quality=80, profile=None, min_scale=1):
+    return index.find(_PATH, width, height, img_format, quality, profile or {}, min_scale)
+
+
+def test_finds_the_smallest_large_enough_variant(index):
+    index.add(_PATH, 'small.jpg', (80, 60), 'jpg', 80, {})
+    index.add(_PATH, 'medium.jpg', (400, 300), 'jpg', 80, {})
+    index.add(_PATH, 'large.jpg', (1600, 1200), 'jpg', 80, {})
+    assert _find(index, width=100) == 'medium.jpg'
+    assert _find(index, width=100, min_scale=8) == 'large.jpg'
+    assert _find(index, width=100, min_scale=32) is None
+
+
+def test_bounds_the_size_by_the_aspect_ratio_of_the_variant(index):
+    index.add(_PATH, 'wide.jpg', (400, 100), 'jpg', 80, {})
+    # 200x50 at the aspect ratio of the variant
+    assert _find(index, width=200, height=0, min_scale=2) == 'wide.jpg'
+    # 800x200 at the aspect ratio of the variant
+    assert _find(index, width=0, height=200) is None
+
+
+def test_lossy_variant_derives_only_the_same_format_and_lower_quality(index):
+    index.add(_PATH, 'lossy.jpg', (400, 300), 'jpg', 80, {})
+    assert _find(index, img_format='jpg', quality=70) == 'lossy.jpg'
+    assert _find(index, img_format='jpg', quality=90) is None
+    assert _find(index, img_format='webp', quality=70) is None
+
+
+def test_lossless_variant_derives_any_format_and_quality(index):
+    index.add(_PATH, 'lossless.png', (400, 300), 'png', 100, {})
+    assert _find(index, img_format='jpg', quality=100) == 'lossless.png'
+    assert _find(index, img_format='webp', quality=50) == 'lossless.png'
+
+
+def test_variant_never_derives_what_its_profile_dropped(index):
+    index.add(_PATH, 'stripped.png', (400, 300), 'png', 100, {'strip': True})
+    assert _find(index, img_format='png', profile={'strip': True}) == 'stripped.png'
+    assert _find(index, img_format='png') is None
+
+
+def test_variant_derives_the_one_dropping_more(index):
+    index.add(_PATH, 'full.jpg', (400, 300), 'jpg', 80, {})
+    assert _find(index, profile={'strip': True, 'sampling_factor': '4:2:0'}) == 'full.jpg'
+
+
+def test_variant_with_another_sampling_factor_is_not_derived_from(index):
+    index.add(_PATH, 'subsampled.jpg', (400, 300), 'jpg', 80, {'sampling_factor': '4:2:0'})
+    assert _find(index, profile={'sampling_factor': '4:4:4'}) is None
+    assert _find(index, profile={'sampling_factor': '4:2:0'}) == 'subsampled.jpg'
+
+
+def test_forgets_the_oldest_variants_over_max_variants():
+    index = VariantIndex(InMemoryStore(), max_variants=2)
+    index.add(_PATH, 'first.jpg', (1600, 1200), 'jpg', 80, {})
+    index.add(_PATH, 'second.jpg', (800, 600), 'jpg', 80, {})
+    index.add(_PATH, 'third.jpg', (400, 300), 'jpg', 80, {})
+    assert sorted(index.cache_store.get_fields(VariantIndex.KEY_PREFIX + _PATH)) == ['second.jpg', 'third.jpg']
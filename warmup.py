@@ -0,0 +1,166 @@
+import argparse
+import sys
+import time
+from concurrent.futures import as_completed
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+import yaml
+
+from fitter import fitter
+from fitter.components import create_app
+from fitter.server.paramset import ParamSet
+from fitter.utils.file import generate_hash
+from fitter.utils.print import eprint
+from fitter.views.pipeline import generate_batch
+
+_USAGE = '''Pre-generate the variants of the source images listed in the manifest
+
+The manifest is a yaml (or json) file of the source paths and the GET params of the variants of each path
+
+  paths:
+    - products/1.jpg
+    - products/2.jpg
+  variants:
+    - {mode: thumbnail, width: 320, height: 0, format: jpg}
+    - {mode: thumbnail, width: 640, height: 0, format: jpg}
+'''
+
+
+class _Progress(object):
+    def __init__(self, total):
+        self.total = total
+        self.generated = 0
+        self.skipped = 0
+        self.not_found = 0
+        self.failed = 0
+        self.started_at = time.time()
+
+    @property
+    def done(self):
+        return self.generated + self.skipped + self.not_found + self.failed
+
+    def report(self, end='\r'):
+        elapsed = time.time() - self.started_at
+        print('[{}/{}] generated: {}, skipped: {}, not found: {}, failed: {} ({:.1f} images/s)'.format(
+            self.done, self.total, self.generated, self.skipped, self.not_found, self.failed,
+            self.generated / elapsed if elapsed > 0 else 0.0,
+        ), end=end, flush=True)
+
+
+def _expand_auto_format(variants):
+    """Replace the variant of 'auto' format with the variants of all the formats it can choose"""
+    expanded = []
+    for variant in variants:
+        if isinstance(variant, dict) and variant.get('format') == 'auto':
+            img_formats = fitter.auto_formats + [fitter.config['OPTIONS']['AUTO_FALLBACK_FORMAT']]
+            expanded.extend(dict(variant, format=img_format) for img_format in img_formats)
+        else:
+            expanded.append(variant)
+    return expanded
+
+
+def _load_manifest(manifest_path):
+    with open(manifest_path, 'r') as manifest_file:
+        manifest = yaml.safe_load(manifest_file) or {}
+    paths = manifest.get('paths') or []
+    variants = _expand_auto_format(manifest.get('variants') or [])
+    if not paths or not variants:
+        eprint('The manifest must have both of \'paths\' and \'variants\'')
+        sys.exit(-1)
+    # The variants are the same for all the paths, so validates them only once
+    _, errors = ParamSet.from_batch({'path': paths[0], 'variants': variants}, len(variants))
+    if errors:
+        eprint('\n'.join(errors))
+        sys.exit(-1)
+    return paths, variants
+
+
+def _list_existing_keys():
+    """List the store storage at once instead of checking each variant
+
+    The exact keys are listed even if the store storage is indexed, as the bloom filter of the index may have
+    false positives, which would be skipped without being generated
+
+    :return: The set of the stored keys, None if each variant is checked on the store storage
+    """
+    try:
+        return set(fitter.store_storage.list_keys())
+    except NotImplementedError:
+        eprint('The store storage can not be listed, so checks each variant one by one')
+        return None
+
+
+def _warm_up_path(path, variants, existing_keys):
+    """Generate the variants of the path which do not exist yet
+
+    :return: The number of the existing variants and the missing ones, and whether if the source image exists
+    """
+    param_sets, _ = ParamSet.from_batch({'path': path, 'variants': variants}, len(variants))
+    hashes = [generate_hash(param_set) for param_set in param_sets]
+    if existing_keys is not None:
+        existing = [hashed for hashed in hashes if hashed in existing_keys]
+        found = existing
+    else:
+        cached = fitter.cache_store.get_many(hashes) if fitter.cache_store is not None else [None] * len(hashes)
+        existing = [hashed for hashed, value in zip(hashes, cached)
+                    if value is not None or fitter.store_storage.exists(key=hashed)]
+        found = [hashed for hashed, value in zip(hashes, cached) if value is None and hashed in existing]
+    # The existing variants are cached too, so the first requests for them do not look up the store storage
+    if found and fitter.cache_store is not None:
+        fitter.cache_store.set_many({hashed: hashed for hashed in found})
+    param_sets = [param_set for hashed, param_set in zip(hashes, param_sets) if hashed not in existing]
+    if not param_sets:
+        return len(existing), 0, True
+    # All the variants of a path are generated from a single decoding of the source image
+    return len(existing), len(param_sets), generate_batch(param_sets, check_existing=False) is not None
+
+
+def _count(progress, path, future, variants):
+    try:
+        existing, missing, found = future.result()
+    except Exception as e:
+        progress.failed += len(variants)
+        eprint('\nFailed to generate the variants of {}: {}'.format(path, e))
+    else:
+        progress.skipped += existing
+        if found:
+            progress.generated += missing
+        else:
+            progress.not_found += missing
+    progress.report()
+
+
+def warm_up(paths, variants, workers):
+    existing_keys = _list_existing_keys()
+    progress = _Progress(len(paths) * len(variants))
+    # Only a bounded window of the paths are submitted at once, not to hold all of them on the executor
+    max_in_flight = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        generating = {}
+        for path in paths:
+            if len(generating) >= max_in_flight:
+                done, _ = wait(generating, return_when=FIRST_COMPLETED)
+                for future in done:
+                    _count(progress, generating.pop(future), future, variants)
+            generating[executor.submit(_warm_up_path, path, variants, existing_keys)] = path
+        for future in as_completed(generating):
+            _count(progress, generating[future], future, variants)
+    # The write behind store storage may still be uploading them
+    fitter.store_storage.flush()
+    progress.report(end='\n')
+    return progress
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=_USAGE, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help='The path of the manifest file')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+                        help='The number of source images generated at once. Default is 4')
+    args = parser.parse_args()
+    # Never takes the jobs queued by the show action of the serving nodes
+    create_app(job_workers=False)
+    paths, variants = _load_manifest(args.manifest)
+    result = warm_up(paths, variants, args.workers)
+    sys.exit(0 if result.failed == 0 else 1)
@@ -0,0 +1,11 @@
+"""The app for the WSGI servers, e.g. gunicorn wsgi:fitter
+
+It is set up on import, so it must not be run as the main module, which the spawned transform workers import again
+"""
+from fitter.components import create_app
+from fitter.server.api import upload
+
+fitter = create_app()
+
+if fitter.config['OPTIONS']['ENABLE_UPLOAD']:
+    fitter.add_url_rule('/upload', view_func=upload, methods=['POST'])